@@ -17,5 +17,7 @@ from . import colorspace
 from . import sound
 from . import arrange
 from . import transform
-from .io import (Metadata, read, read_png, write_png, read_netpbm,
-                 write_netpbm, write_ascii, recreate_script_from_png)
+from . import pipeline
+from .io import (Metadata, read, read_many, read_iter, read_png, write_png,
+                 read_netpbm, write_netpbm, write_ascii,
+                 recreate_script_from_png)
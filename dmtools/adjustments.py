@@ -1,27 +1,154 @@
+import threading
 import numpy as np
-from typing import Callable
+from functools import partial
+from collections import OrderedDict
+from typing import Callable, List
 
 
-def apply_curve(image: np.ndarray, f: Callable, c: int = -1) -> np.ndarray:
+_LUT_CACHE_SIZE = 64
+_lut_cache = OrderedDict()
+_lut_cache_lock = threading.Lock()
+
+
+def _curve_lut(f: Callable, size: int) -> np.ndarray:
+    """Return a look up table of f sampled at size points in [0,1].
+
+    Tables are cached by the identity of the curve and the size.
+
+    Args:
+        f (Callable): Curve to sample. f: [0,1] -> [0,1].
+        size (int): Number of entries in the table.
+
+    Returns:
+        np.ndarray: Values of f at size evenly spaced points in [0,1].
+    """
+    if size < 2:
+        raise ValueError("A look up table needs at least 2 entries.")
+    key = (f, size)
+    try:
+        with _lut_cache_lock:
+            lut = _lut_cache[key]
+            _lut_cache.move_to_end(key)
+        return lut
+    except TypeError:
+        # unhashable curves are not cached
+        return np.asarray(f(np.linspace(0, 1, size)), dtype=float)
+    except KeyError:
+        pass
+    # the curve is sampled outside the lock
+    lut = np.asarray(f(np.linspace(0, 1, size)), dtype=float)
+    lut.flags.writeable = False
+    with _lut_cache_lock:
+        lut = _lut_cache.setdefault(key, lut)
+        _lut_cache.move_to_end(key)
+        while len(_lut_cache) > _LUT_CACHE_SIZE:
+            _lut_cache.popitem(last=False)
+    return lut
+
+
+def _lookup(x: np.ndarray, lut: np.ndarray, interpolate: bool,
+            out: np.ndarray = None) -> np.ndarray:
+    """Apply a curve to x through its look up table.
+
+    Args:
+        x (np.ndarray): Values in [0,1] to apply the curve to.
+        lut (np.ndarray): Look up table of the curve (see _curve_lut).
+        interpolate (bool): Linearly interpolate between table entries \
+            rather than using the nearest entry.
+        out (np.ndarray): Array to write the result into. Defaults to None.
+
+    Returns:
+        np.ndarray: Curve applied to x.
+    """
+    k = len(lut) - 1
+    if interpolate:
+        result = np.interp(x, np.linspace(0, 1, k + 1), lut)
+        if out is None:
+            return result
+        out[...] = result
+        return out
+    i = np.empty(np.shape(x), dtype=np.intp)
+    np.rint(np.multiply(x, k), out=i, casting='unsafe')
+    np.clip(i, 0, k, out=i)
+    return lut.take(i, out=out)
+
+
+def apply_curve(image: np.ndarray, f: Callable, c: int = -1,
+                lut: int = None, interpolate: bool = False) -> np.ndarray:
     """Apply a curve f to an  image or channel of an image.
 
+    If lut is given, f is sampled once into a look up table with lut entries
+    and applied to the image by look up rather than by evaluating f at every
+    pixel. With 256 entries, images read from 8-bit sources are graded exactly.
+    Tables are cached so the same curve is only sampled once.
+
     Args:
         image (np.ndarray): Image on which to apply curve.
         f (Callable): Curve to apply. f: [0,1] -> [0,1].
         c (int): Channel to apply curve to. Apply to all channels if -1.
+        lut (int): Number of entries in the look up table (e.g. 256, 1024, \
+            or 65536). Evaluate f directly if None. Defaults to None.
+        interpolate (bool): Linearly interpolate between look up table \
+            entries rather than using the nearest entry. Defaults to False.
 
     Returns:
         np.ndarray: Image with curve applied.
     """
-    image = np.copy(image)
-    if c == -1:
-        if len(image.shape) == 2:
-            return f(image)
+    if c != -1:
+        curves = [None] * image.shape[2]
+        curves[c] = f
+        return apply_curves(image, curves, lut=lut, interpolate=interpolate)
+    if lut is not None:
+        f = partial(_lookup, lut=_curve_lut(f, lut), interpolate=interpolate)
+    if len(image.shape) == 2:
+        return f(np.copy(image))
+    # curves are applied to the copy so they may work in place
+    result = np.copy(image)
+    result[:,:,:3] = f(result[:,:,:3])
+    return result
+
+
+def apply_curves(image: np.ndarray, curves: List[Callable],
+                 out: np.ndarray = None, lut: int = None,
+                 interpolate: bool = False) -> np.ndarray:
+    """Apply a different curve to each channel of an image.
+
+    Each curve only reads and writes its own channel. Curves are applied to
+    the channels of out (after copying the image into them), so the image is
+    only modified if it is passed as out to apply the curves in place. See
+    apply_curve for the look up table options.
+
+    Args:
+        image (np.ndarray): Image on which to apply curves.
+        curves (List[Callable]): Curve to apply to each channel. Channels \
+            with a curve of None or past the end of the list are unchanged.
+        out (np.ndarray): Array to write the result into. Defaults to a new \
+            array.
+        lut (int): Number of entries in the look up table (e.g. 256, 1024, \
+            or 65536). Evaluate curves directly if None. Defaults to None.
+        interpolate (bool): Linearly interpolate between look up table \
+            entries rather than using the nearest entry. Defaults to False.
+
+    Returns:
+        np.ndarray: Image with curves applied.
+    """
+    if len(curves) > image.shape[2]:
+        raise ValueError(f"{len(curves)} curves given for an image with "
+                         f"{image.shape[2]} channels.")
+    if out is None:
+        out = np.empty_like(image)
+    elif out.shape != image.shape:
+        raise ValueError("out must have the same shape as image.")
+    for c in range(image.shape[2]):
+        f = curves[c] if c < len(curves) else None
+        if f is None:
+            if out is not image:
+                out[:,:,c] = image[:,:,c]
+        elif lut is not None:
+            _lookup(image[:,:,c], _curve_lut(f, lut), interpolate,
+                    out=out[:,:,c])
         else:
-            image[:,:,:3] = f(image[:,:,:3])
-            return image
-    else:
-        n,m,k = image.shape
-        channels = np.reshape(image, (n*m,k))
-        channels[:,c] = f(channels[:,c])
-        return np.reshape(channels, (n,m,k))
+            if out is not image:
+                out[:,:,c] = image[:,:,c]
+            out[:,:,c] = f(out[:,:,c])
+    return out
@@ -1,29 +1,129 @@
-import imageio
+import imageio_ffmpeg
+import time
+import zlib
+import struct
+import tempfile
+import queue
+import threading
 import numpy as np
+from PIL import Image, GifImagePlugin
 from math import ceil
-from typing import List
+from functools import partial
+from itertools import islice, chain
+from collections import OrderedDict, namedtuple
+from collections.abc import Sequence
+from typing import List, Tuple, Union, Callable, Iterator, Iterable
 import logging
-from .io import read, _discretize
+from .io import (read, _map_ordered, _continuous, _discretize,
+                 _bind_args)
 from . import sound
 from ._log import _log_msg
 import os
 
 
-def clip(path: str, start: int = 0, end: int = -1) -> List[np.ndarray]:
-    """Return a list of images in the given directory.
+class FrameSequence(Sequence):
+    """A lazy sequence of frames read from image files.
+
+    Frames are only decoded when they are accessed so memory does not grow
+    with the length of the sequence. Recently accessed frames are kept in a
+    small least-recently-used cache and accessing a frame returns a copy of
+    the cached frame. Iterating over the sequence decodes frames ahead of the
+    consumer in a pool of workers (see :code:`io.read_iter`). Slicing returns
+    another lazy sequence.
+    """
+
+    def __init__(self, paths: List[str], workers: int = None,
+                 cache_size: int = 8, ops: List[Callable] = None):
+        """Initialize a frame sequence.
+
+        Args:
+            paths (List[str]): String file paths of the frames (in order).
+            workers (int): Number of workers decoding frames when iterating. \
+                Defaults to the number of CPUs.
+            cache_size (int): Number of decoded frames to cache. Defaults to 8.
+            ops (List[Callable]): Functions applied to each decoded frame \
+                (in order). Defaults to None.
+        """
+        self.paths = list(paths)
+        self.workers = workers
+        self.cache_size = cache_size
+        self._ops = [] if ops is None else list(ops)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __getitem__(self, i: Union[int, slice]):
+        if isinstance(i, slice):
+            return FrameSequence(paths=self.paths[i], workers=self.workers,
+                                 cache_size=self.cache_size, ops=self._ops)
+        path = self.paths[i]
+        with self._lock:
+            if path in self._cache:
+                self._cache.move_to_end(path)
+                return self._cache[path].copy()
+        frame = self._load(path)
+        with self._lock:
+            self._cache[path] = frame
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        # callers get their own copy so editing it cannot change the cache
+        return frame.copy()
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        return _map_ordered(self._load, self.paths, workers=self.workers)
+
+    def _load(self, path: str) -> np.ndarray:
+        frame = read(path)
+        for op in self._ops:
+            frame = op(frame)
+        return frame
+
+    def map(self, f: Callable, *args, **kwargs) -> 'FrameSequence':
+        """Return a lazy sequence with f applied to every frame.
+
+        This allows the transform, colorspace, and adjustments functions to be
+        applied to an entire clip without materializing it. For example,
+        :code:`frames.map(transform.rescale, k=2)`.
+
+        Args:
+            f (Callable): Function taking a frame as its first argument.
+            *args: Additional positional arguments to f.
+            **kwargs: Additional keyword arguments to f.
+
+        Returns:
+            FrameSequence: Sequence of the frames with f applied.
+        """
+        op = _bind_args(f, *args, **kwargs)
+        return FrameSequence(paths=self.paths, workers=self.workers,
+                             cache_size=self.cache_size, ops=self._ops + [op])
+
+
+def clip(path: str, start: int = 0, end: int = -1, step: int = 1,
+         workers: int = None, cache_size: int = 8) -> FrameSequence:
+    """Return a lazy sequence of the images in the given directory.
 
     Images are ordered according to their name. Hence, the following naming
     convention is recommend.
 
     name0000.png, name0001.png, ...
 
+    Frames are decoded on access (see :code:`FrameSequence`). Use
+    :code:`list(clip(...))` to read every frame into memory.
+
     Args:
         path (str): String directory path.
         start (int, optional): Starting frame. Defaults to 0.
         end (int, optional): Ending frame. Defaults to -1.
+        step (int, optional): Step between frames. Defaults to 1.
+        workers (int, optional): Number of workers decoding frames in \
+            parallel. Defaults to the number of CPUs.
+        cache_size (int, optional): Number of decoded frames to cache. \
+            Defaults to 8.
 
     Returns:
-        List[np.ndarray]: List of NumPy arrays representing images.
+        FrameSequence: Lazy sequence of NumPy arrays representing images.
     """
     def listdir_nohidden(path):
         for f in os.listdir(path):
@@ -31,51 +131,699 @@ def clip(path: str, start: int = 0, end: int = -1) -> List[np.ndarray]:
                 yield f
 
     files = sorted(listdir_nohidden(path))
-    files = files[start:end]
+    files = files[start:end:step]
     paths = ["%s/%s" % (path, f) for f in files]
-    frames = [read(path) for path in paths]
-    return frames
+    return FrameSequence(paths, workers=workers, cache_size=cache_size)
 
 
-def _pad_to_16(M: np.ndarray) -> np.ndarray:
+def _pad_geometry(shape: Tuple[int, ...]) -> Tuple[Tuple[int, ...], tuple]:
+    """Return the shape padded to multiples of 16 and the interior slices.
+
+    Args:
+        shape (Tuple[int, ...]): Shape of the unpadded image.
+
+    Returns:
+        Tuple[Tuple[int, ...], tuple]: Padded shape and the index selecting \
+            the original image inside a padded image.
+    """
     # TODO: Get a better understanding why image demensions need to be
     # multiplies of 16. It appears this requirement is no longer from ffmpeg.
     # Adapted from code by: https://stackoverflow.com/users/9698684/yatu
-    m,n,*_ = M.shape
+    m,n,*k = shape
     y_pad = (ceil(m/16)*16-m)
-    y_pad_split = (y_pad // 2, y_pad // 2 + y_pad % 2)
     x_pad = (ceil(n/16)*16-n)
-    x_pad_split = (x_pad // 2, x_pad // 2 + x_pad % 2)
-    if len(M.shape) == 3:
-        return np.pad(M, (y_pad_split, x_pad_split, (0, 0)))
-    else:
-        return np.pad(M, (y_pad_split, x_pad_split))
+    padded_shape = (m + y_pad, n + x_pad, *k)
+    interior = (slice(y_pad // 2, y_pad // 2 + m),
+                slice(x_pad // 2, x_pad // 2 + n))
+    return padded_shape, interior
+
+
+def _pad_to_16(M: np.ndarray) -> np.ndarray:
+    padded_shape, interior = _pad_geometry(M.shape)
+    padded = np.zeros(padded_shape, dtype=M.dtype)
+    padded[interior] = M
+    return padded
+
+
+# ffmpeg input pixel format for each number of channels
+_PIX_FMT = {1: 'gray', 3: 'rgb24', 4: 'rgba'}
+
+
+class MP4Writer:
+    """Write an animation to a .mp4 file one frame at a time.
+
+    Each frame is discretized into a reused padded buffer and piped to a
+    single ffmpeg process (through imageio-ffmpeg) as soon as it is appended
+    so only the current frame is held in memory regardless of the length of
+    the animation. If audio is given, it is written to a uniquely named
+    temporary WAV file in scratch_dir and muxed by the same ffmpeg process, so
+    the video is encoded exactly once and concurrent writers never share
+    files. Use as a context manager or call :code:`close` when done.
+
+    .. code-block:: python
+
+        with MP4Writer("animation.mp4", fps=24) as writer:
+            for frame in frames:
+                writer.append(frame)
+    """
+
+    def __init__(self, path: str, fps: int, s: int = 1,
+                 audio: sound.WAV = None, scratch_dir: str = None):
+        """Initialize the writer.
+
+        Args:
+            path (str): String file path.
+            fps (int): Frames per second.
+            s (int, optional): Multiplier for scaling. Defaults to 1.
+            audio (sound.WAV): Audio for the animation (None if no audio).
+            scratch_dir (str): Directory for the temporary audio file. \
+                Defaults to the system temporary directory.
+        """
+        self.path = path
+        self.fps = fps
+        self.s = s
+        self.audio = audio
+        self.scratch_dir = scratch_dir
+        self._shape = None
+        self._gen = None
+        self._audio_path = None
+
+    def _start(self, shape: Tuple[int, ...]):
+        """Allocate the frame buffers and start ffmpeg.
+
+        The padded geometry is computed once. Every frame is then discretized
+        into the interior of the same padded buffer whose border is never
+        written, so no per-frame arrays are allocated.
 
+        Args:
+            shape (Tuple[int, ...]): Shape of every (unpadded) frame.
+        """
+        padded_shape, self._interior = _pad_geometry(shape)
+        self._padded = np.zeros(padded_shape, dtype=np.uint8)
+        self._scaled = np.empty(shape)
+        self._discrete = np.empty(shape, dtype=int)
+        h, w, *k = padded_shape
+        if self.audio is not None:
+            fd, self._audio_path = tempfile.mkstemp(suffix='.wav',
+                                                    dir=self.scratch_dir)
+            os.close(fd)
+            self.audio.to_wav(self._audio_path)
+        self._shape = shape
+        self._gen = imageio_ffmpeg.write_frames(
+            self.path,
+            (w, h),
+            pix_fmt_in=_PIX_FMT[k[0] if k else 1],
+            fps=self.fps,
+            macro_block_size=16,
+            output_params=["-vf", "scale=iw*%d:ih*%d" % (self.s, self.s),
+                           "-sws_flags", "neighbor"],
+            audio_path=self._audio_path,
+            audio_codec=None if self._audio_path is None else 'aac')
+        self._gen.send(None)
 
-def to_mp4(frames: List[np.ndarray], path: str, fps: int, s: int = 1,
-           audio: sound.WAV = None):
-    """Write an animation as a .mp4 file using ffmpeg through imageio.mp4
+    def append(self, frame: np.ndarray):
+        """Append a frame to the animation.
+
+        Args:
+            frame (np.ndarray): Frame with values in [0,1].
+        """
+        if self._gen is None:
+            self._start(frame.shape)
+        elif frame.shape != self._shape:
+            raise ValueError("All frames in an animation must have the same "
+                             "dimensions.")
+        # same as _discretize(frame, 255) but into the preallocated buffers
+        np.multiply(frame, 255, out=self._scaled)
+        np.subtract(self._scaled, 0.5, out=self._scaled)
+        np.ceil(self._scaled, out=self._scaled)
+        np.copyto(self._discrete, self._scaled, casting='unsafe')
+        np.copyto(self._padded[self._interior], self._discrete,
+                  casting='unsafe')
+        self._gen.send(self._padded)
+
+    def write(self, frames: Iterable[np.ndarray]):
+        """Append every frame of an iterable (consumed lazily).
+
+        Args:
+            frames (Iterable[np.ndarray]): Frames to append.
+        """
+        for frame in frames:
+            self.append(frame)
+
+    def _cleanup(self):
+        """Stop ffmpeg and remove the temporary audio file."""
+        try:
+            if self._gen is not None:
+                self._gen.close()
+        finally:
+            if self._audio_path is not None:
+                os.remove(self._audio_path)
+                self._audio_path = None
+
+    def close(self):
+        """Finish writing the animation."""
+        if self._gen is None:
+            raise ValueError("An animation must have at least one frame.")
+        self._cleanup()
+        name = self.path.split('/')[-1]
+        logging.info(_log_msg(name, os.stat(self.path).st_size))
+
+    def __enter__(self) -> 'MP4Writer':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._cleanup()
+
+
+def to_mp4(frames: Iterable[np.ndarray], path: str, fps: int, s: int = 1,
+           audio: sound.WAV = None, scratch_dir: str = None):
+    """Write an animation as a .mp4 file using ffmpeg through imageio-ffmpeg
+
+    Frames are consumed one at a time (see :code:`MP4Writer`) so frames may be
+    given by a generator or a FrameSequence.
 
     Args:
-        frames (List[np.ndarray]): List of frames in the animation.
+        frames (Iterable[np.ndarray]): Frames in the animation (a list, \
+            generator, or FrameSequence).
         audio (sound.WAV): Audio for the animation (None if no audio).
         path (str): String file path.
         fps (int): Frames per second.
         s (int, optional): Multiplier for scaling. Defaults to 1.
+        scratch_dir (str): Directory for the temporary audio file. \
+            Defaults to the system temporary directory.
+    """
+    with MP4Writer(path, fps=fps, s=s, audio=audio,
+                   scratch_dir=scratch_dir) as writer:
+        writer.write(frames)
+
+
+def _mp4_frames(path: str, start: int, end: int, step: int,
+                uint8: bool) -> Iterator[np.ndarray]:
+    """Yield the frames of a video file (see :code:`read_mp4`)."""
+    probe = imageio_ffmpeg.read_frames(path)
+    fps = next(probe)['fps']
+    probe.close()
+
+    input_params = []
+    skip = start
+    if start > 0 and fps > 0:
+        # seeking before the input jumps to the nearest preceding keyframe
+        # and decodes from there instead of from the start of the file. Seek
+        # half a frame early so rounding never drops the first frame.
+        input_params = ["-ss", "%.6f" % ((start - 0.5) / fps)]
+        skip = 0
+
+    reader = imageio_ffmpeg.read_frames(path, input_params=input_params)
+    try:
+        w, h = next(reader)['size']
+        i = start - skip
+        for data in reader:
+            if end is not None and i >= end:
+                break
+            if i >= start and (i - start) % step == 0:
+                frame = np.frombuffer(data, dtype=np.uint8).reshape(h, w, 3)
+                # frames over the bytes from ffmpeg are read-only
+                yield frame.copy() if uint8 else _continuous(frame, 255)
+            i += 1
+    finally:
+        reader.close()
+
+
+def read_mp4(path: str, start: int = 0, end: int = None, step: int = 1,
+             uint8: bool = False) -> Iterator[np.ndarray]:
+    """Read the frames of a video file using ffmpeg through imageio-ffmpeg.
+
+    Frames are decoded lazily as the returned iterator is consumed. When start
+    is given, ffmpeg seeks to the nearest keyframe before it rather than
+    decoding the whole file up to that point.
+
+    Args:
+        path (str): String file path.
+        start (int, optional): Starting frame. Defaults to 0.
+        end (int, optional): Ending frame (exclusive). Defaults to the end \
+            of the video.
+        step (int, optional): Step between frames. Defaults to 1.
+        uint8 (bool, optional): Yield frames as (writable) uint8 arrays \
+            with values in [0,255] rather than continuous images with values \
+            in [0,1]. Defaults to False.
+
+    Returns:
+        Iterator[np.ndarray]: Iterator over NumPy arrays representing frames.
+    """
+    if start < 0 or step < 1 or (end is not None and end < 0):
+        raise ValueError("start and end must be nonnegative and step "
+                         "must be positive.")
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    return _mp4_frames(path, start, end, step, uint8)
+
+
+def _to_rgb_uint8(frame: np.ndarray) -> np.ndarray:
+    """Discretize a frame to 8-bit RGB (the alpha channel is discarded)."""
+    frame = _discretize(frame, 255).astype(np.uint8)
+    if len(frame.shape) == 2:
+        return np.stack(3 * (frame,), axis=-1)
+    return np.ascontiguousarray(frame[:,:,:3])
+
+
+def _shared_palette(frames: Iterable[np.ndarray], samples: int,
+                    palette_frames: Iterable[np.ndarray] = None
+                    ) -> Tuple[Image.Image, Iterable]:
+    """Compute one 256 color palette for every frame of a clip.
+
+    If palette_frames is given, the palette is computed from those frames.
+    Otherwise, if frames is a sequence, it is computed from up to samples
+    evenly spaced frames. Otherwise, it is computed from the first samples
+    frames, which are buffered and chained back in front of the rest.
+
+    Args:
+        frames (Iterable[np.ndarray]): Frames of the clip.
+        samples (int): Maximum number of frames to sample.
+        palette_frames (Iterable[np.ndarray]): Frames to compute the palette \
+            from. Defaults to None.
+
+    Returns:
+        Tuple[Image.Image, Iterable]: Palette image and the (unconsumed) \
+            frames.
+    """
+    if palette_frames is not None:
+        sampled = list(palette_frames)
+    elif isinstance(frames, Sequence):
+        n = len(frames)
+        indices = np.unique(np.linspace(0, n - 1, min(samples, n)).astype(int))
+        sampled = [frames[i] for i in indices]
+    else:
+        frames = iter(frames)
+        sampled = list(islice(frames, max(samples, 1)))
+        frames = chain(sampled, frames)
+    if len(sampled) == 0:
+        raise ValueError("An animation must have at least one frame.")
+    montage = np.vstack([_to_rgb_uint8(frame) for frame in sampled])
+    palette = Image.fromarray(montage, 'RGB').quantize(
+        colors=256, method=Image.MEDIANCUT)
+    return palette, frames
+
+
+class _PaletteAnimationWriter:
+    """Base class of animation writers with a shared palette.
+
+    Every frame is quantized to one palette computed once per clip. Only the
+    bounding box of the pixels that changed since the previous frame is
+    stored, and frames identical to the previous frame extend its duration.
+    Frames are written as they are appended so memory does not grow with the
+    length of the clip. Subclasses implement :code:`_write_header`,
+    :code:`_write_frame`, and :code:`_write_trailer`.
+    """
+
+    def __init__(self, path: str, fps: int, palette: Image.Image, s: int = 1,
+                 loop: int = 0):
+        """Initialize the writer.
+
+        Args:
+            path (str): String file path.
+            fps (int): Frames per second.
+            palette (Image.Image): Palette image (see :code:`_shared_palette`).
+            s (int, optional): Multiplier for scaling. Defaults to 1.
+            loop (int, optional): Number of loops (0 loops forever). \
+                Defaults to 0.
+        """
+        self.path = path
+        self.fps = fps
+        self.s = s
+        self.loop = loop
+        self._palette = palette
+        colors = np.array(palette.getpalette()[:768], dtype=np.uint8)
+        self._palette_rgb = np.zeros((256, 3), dtype=np.uint8)
+        self._palette_rgb[:len(colors) // 3] = colors.reshape(-1, 3)
+        self._f = open(path, 'wb')
+        self._previous = None
+        self._pending = None
+        self._frames_written = 0
+
+    def _quantize(self, frame: np.ndarray) -> np.ndarray:
+        """Return the palette indices of the (scaled) frame."""
+        rgb = Image.fromarray(_to_rgb_uint8(frame), 'RGB')
+        indices = np.asarray(rgb.quantize(palette=self._palette,
+                                          dither=Image.NONE))
+        if self.s != 1:
+            indices = np.repeat(np.repeat(indices, self.s, axis=0),
+                                self.s, axis=1)
+        return indices
+
+    def append(self, frame: np.ndarray):
+        """Append a frame to the animation.
+
+        Args:
+            frame (np.ndarray): Frame with values in [0,1].
+        """
+        indices = self._quantize(frame)
+        if self._previous is None:
+            self._shape = indices.shape
+            self._write_header(indices.shape)
+            self._pending = [indices, (0, 0), 1]
+        elif indices.shape != self._shape:
+            raise ValueError("All frames in an animation must have the same "
+                             "dimensions.")
+        else:
+            changed = indices != self._previous
+            rows = np.flatnonzero(changed.any(axis=1))
+            if len(rows) == 0:
+                self._pending[2] += 1
+            else:
+                cols = np.flatnonzero(changed.any(axis=0))
+                y0, y1 = rows[0], rows[-1] + 1
+                x0, x1 = cols[0], cols[-1] + 1
+                self._flush()
+                self._pending = [indices[y0:y1, x0:x1], (x0, y0), 1]
+        self._previous = indices
+
+    def write(self, frames: Iterable[np.ndarray]):
+        """Append every frame of an iterable (consumed lazily).
+
+        Args:
+            frames (Iterable[np.ndarray]): Frames to append.
+        """
+        for frame in frames:
+            self.append(frame)
+
+    def _flush(self):
+        """Write the pending frame."""
+        indices, offset, n = self._pending
+        self._write_frame(np.ascontiguousarray(indices), offset,
+                          self._frames_written, n)
+        self._frames_written += n
+        self._pending = None
+
+    def close(self):
+        """Finish writing the animation."""
+        try:
+            if self._pending is None:
+                raise ValueError("An animation must have at least one frame.")
+            self._flush()
+            self._write_trailer()
+        finally:
+            self._f.close()
+        name = self.path.split('/')[-1]
+        logging.info(_log_msg(name, os.stat(self.path).st_size))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._f.close()
+
+
+class GIFWriter(_PaletteAnimationWriter):
+    """Write an animation to a .gif file one frame at a time.
+
+    See :code:`_PaletteAnimationWriter`. Frames are LZW encoded by Pillow.
+    """
+
+    def _write_header(self, shape: Tuple[int, int]):
+        h, w = shape
+        # logical screen descriptor with a global color table of 256 colors
+        self._f.write(b"GIF89a" + struct.pack("<HHBBB", w, h, 0xF7, 0, 0))
+        self._f.write(self._palette_rgb.tobytes())
+        # NETSCAPE2.0 application extension for looping
+        self._f.write(b"!\xff\x0bNETSCAPE2.0\x03\x01"
+                      + struct.pack("<H", self.loop) + b"\0")
+
+    def _write_frame(self, indices: np.ndarray, offset: Tuple[int, int],
+                     i: int, n: int):
+        # GIF durations are in hundredths of a second, so round the start and
+        # end time of each frame (not its duration) to avoid drift
+        duration = round((i + n) * 100 / self.fps) - round(i * 100 / self.fps)
+        image = Image.fromarray(indices, 'P')
+        # disposal 1 leaves the frame in place for the next frame to cover
+        for data in GifImagePlugin.getdata(image, offset=offset,
+                                           duration=10 * duration,
+                                           disposal=1):
+            self._f.write(data)
+
+    def _write_trailer(self):
+        self._f.write(b";")
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    """Return a PNG chunk of the given type."""
+    return (struct.pack(">I", len(data)) + chunk_type + data
+            + struct.pack(">I", zlib.crc32(chunk_type + data)))
+
+
+class APNGWriter(_PaletteAnimationWriter):
+    """Write an animation to an animated .png file one frame at a time.
+
+    See :code:`_PaletteAnimationWriter`. Frames are stored with the indexed
+    color type and compressed with zlib. The number of frames is written when
+    the writer is closed.
+    """
+
+    def _write_header(self, shape: Tuple[int, int]):
+        h, w = shape
+        self._f.write(b"\x89PNG\r\n\x1a\n")
+        self._f.write(_png_chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 3,
+                                                      0, 0, 0)))
+        self._f.write(_png_chunk(b"PLTE", self._palette_rgb.tobytes()))
+        self._actl_position = self._f.tell()
+        self._f.write(_png_chunk(b"acTL", struct.pack(">II", 0, self.loop)))
+        self._sequence_number = 0
+        self._num_frames = 0
+
+    def _write_frame(self, indices: np.ndarray, offset: Tuple[int, int],
+                     i: int, n: int):
+        h, w = indices.shape
+        # every scanline is prefixed with filter type 0 (none)
+        scanlines = np.zeros((h, w + 1), dtype=np.uint8)
+        scanlines[:,1:] = indices
+        data = zlib.compress(scanlines.tobytes())
+        # dispose op 0 (none) and blend op 0 (source)
+        self._f.write(_png_chunk(b"fcTL", struct.pack(
+            ">IIIIIHHBB", self._sequence_number, w, h, offset[0], offset[1],
+            n, self.fps, 0, 0)))
+        self._sequence_number += 1
+        if i == 0:
+            self._f.write(_png_chunk(b"IDAT", data))
+        else:
+            self._f.write(_png_chunk(b"fdAT", struct.pack(
+                ">I", self._sequence_number) + data))
+            self._sequence_number += 1
+        self._num_frames += 1
+
+    def _write_trailer(self):
+        self._f.write(_png_chunk(b"IEND", b""))
+        self._f.seek(self._actl_position)
+        self._f.write(_png_chunk(b"acTL", struct.pack(">II", self._num_frames,
+                                                      self.loop)))
+
+
+def to_gif(frames: Iterable[np.ndarray], path: str, fps: int, s: int = 1,
+           loop: int = 0, palette_samples: int = 8,
+           palette_frames: Iterable[np.ndarray] = None):
+    """Write an animation as a .gif file.
+
+    Every frame is quantized to one 256 color palette computed once per clip
+    and only the region that changed since the previous frame is stored (see
+    :code:`GIFWriter`). Frames are consumed one at a time.
+
+    Args:
+        frames (Iterable[np.ndarray]): Frames in the animation (a list, \
+            generator, or FrameSequence).
+        path (str): String file path.
+        fps (int): Frames per second.
+        s (int, optional): Multiplier for scaling. Defaults to 1.
+        loop (int, optional): Number of loops (0 loops forever). \
+            Defaults to 0.
+        palette_samples (int, optional): Number of frames sampled to compute \
+            the palette. Evenly spaced frames are sampled from a sequence \
+            and the first frames from any other iterable. Defaults to 8.
+        palette_frames (Iterable[np.ndarray], optional): Representative \
+            frames to compute the palette from instead. Defaults to None.
+    """
+    palette, frames = _shared_palette(frames, palette_samples, palette_frames)
+    with GIFWriter(path, fps=fps, palette=palette, s=s, loop=loop) as writer:
+        writer.write(frames)
+
+
+def to_apng(frames: Iterable[np.ndarray], path: str, fps: int, s: int = 1,
+            loop: int = 0, palette_samples: int = 8,
+            palette_frames: Iterable[np.ndarray] = None):
+    """Write an animation as an animated .png (APNG) file.
+
+    Every frame is quantized to one 256 color palette computed once per clip
+    and only the region that changed since the previous frame is stored (see
+    :code:`APNGWriter`). Frames are consumed one at a time.
+
+    Args:
+        frames (Iterable[np.ndarray]): Frames in the animation (a list, \
+            generator, or FrameSequence).
+        path (str): String file path.
+        fps (int): Frames per second.
+        s (int, optional): Multiplier for scaling. Defaults to 1.
+        loop (int, optional): Number of loops (0 loops forever). \
+            Defaults to 0.
+        palette_samples (int, optional): Number of frames sampled to compute \
+            the palette. Evenly spaced frames are sampled from a sequence \
+            and the first frames from any other iterable. Defaults to 8.
+        palette_frames (Iterable[np.ndarray], optional): Representative \
+            frames to compute the palette from instead. Defaults to None.
     """
-    frames = [_discretize(f, 255).astype(np.uint8) for f in frames]
-    frames = [_pad_to_16(f) for f in frames]
-    imageio.mimwrite(uri="tmp.mp4" if audio is not None else path,
-                     ims=frames,
-                     format='FFMPEG',
-                     fps=fps,
-                     output_params=["-vf", "scale=iw*%d:ih*%d" % (s, s),
-                                    "-sws_flags", "neighbor"])
-    if audio is not None:
-        audio.to_wav("tmp.wav")
-        os.system("ffmpeg -i %s -i %s -c:v copy -c:a aac -y %s"
-                  % ("tmp.mp4", "tmp.wav", path))
-        os.system("rm tmp.mp4")
-        os.system("rm tmp.wav")
-    name = path.split('/')[-1]
-    logging.info(_log_msg(name, os.stat(path).st_size))
+    palette, frames = _shared_palette(frames, palette_samples, palette_frames)
+    with APNGWriter(path, fps=fps, palette=palette, s=s, loop=loop) as writer:
+        writer.write(frames)
+
+
+RenderStats = namedtuple('RenderStats',
+                         'frames wall_time produce_time encode_time')
+RenderStats.__doc__ = """\
+Per-stage timing of a render (see :code:`render`).
+
+Parameters:
+    frames (int): Number of frames rendered.
+    wall_time (float): Total time (seconds) of the render.
+    produce_time (float): Time (seconds) spent producing frames, summed over \
+        every worker.
+    encode_time (float): Time (seconds) the encoder spent encoding frames.
+"""
+
+
+class _RenderAborted(Exception):
+    """Raised in the encoder of render when producing a frame failed."""
+
+
+def _timed_call(f: Callable, i: int) -> Tuple[np.ndarray, float]:
+    """Return f(i) and the time (seconds) it took to compute."""
+    t = time.perf_counter()
+    frame = f(i)
+    return frame, time.perf_counter() - t
+
+
+def _timed_iter(frames: Iterable) -> Iterator[Tuple[np.ndarray, float]]:
+    """Yield each frame and the time (seconds) it took to produce."""
+    frames = iter(frames)
+    while True:
+        t = time.perf_counter()
+        try:
+            frame = next(frames)
+        except StopIteration:
+            return
+        yield frame, time.perf_counter() - t
+
+
+def render(frames: Union[Callable[[int], np.ndarray], Iterable[np.ndarray]],
+           path: str, fps: int, n: int = None, s: int = 1,
+           audio: sound.WAV = None, scratch_dir: str = None,
+           workers: int = None, queue_size: int = None,
+           processes: bool = False) -> RenderStats:
+    """Render an animation, producing frames while encoding them.
+
+    Frames are produced by frames(i) for i in range(n) in a pool of workers
+    while a dedicated encoder thread consumes them (in order) from a bounded
+    queue and writes them with :code:`MP4Writer`. When the encoder falls
+    behind, the queue fills and producers wait, so at most roughly
+    2 * queue_size frames are held in memory. If frames is an iterable (such
+    as a generator or FrameSequence), it is consumed in the calling thread
+    while the encoder runs. If producing a frame fails, the encoder is
+    aborted, the partial output file is removed, and the error is raised.
+
+    Args:
+        frames (Union[Callable[[int], np.ndarray], Iterable[np.ndarray]]): \
+            Function returning the i-th frame or an iterable of frames.
+        path (str): String file path.
+        fps (int): Frames per second.
+        n (int): Number of frames. Required if frames is a function.
+        s (int, optional): Multiplier for scaling. Defaults to 1.
+        audio (sound.WAV): Audio for the animation (None if no audio).
+        scratch_dir (str): Directory for the temporary audio file. \
+            Defaults to the system temporary directory.
+        workers (int): Number of workers producing frames. Defaults to the \
+            number of CPUs.
+        queue_size (int): Maximum number of frames waiting to be encoded. \
+            Defaults to 2 * workers.
+        processes (bool): Produce frames in a process pool rather than a \
+            thread pool. The function must be picklable.
+
+    Returns:
+        RenderStats: Per-stage timing of the render.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if queue_size is None:
+        queue_size = 2 * workers
+    if callable(frames):
+        if n is None:
+            raise ValueError("Provide the number of frames n.")
+        produced = _map_ordered(partial(_timed_call, frames), range(n),
+                                workers=workers, prefetch=queue_size,
+                                processes=processes)
+    else:
+        produced = _timed_iter(frames)
+
+    start = time.perf_counter()
+    q = queue.Queue(maxsize=max(queue_size, 1))
+    encoder_state = {'time': 0.0, 'error': None}
+
+    def encode():
+        try:
+            with MP4Writer(path, fps=fps, s=s, audio=audio,
+                           scratch_dir=scratch_dir) as writer:
+                while True:
+                    frame = q.get()
+                    if frame is None:
+                        break
+                    if frame is _RenderAborted:
+                        raise _RenderAborted()
+                    t = time.perf_counter()
+                    writer.append(frame)
+                    encoder_state['time'] += time.perf_counter() - t
+        except _RenderAborted:
+            # the writer was cleaned up without finishing the animation
+            if os.path.exists(path):
+                os.remove(path)
+        except Exception as e:
+            encoder_state['error'] = e
+
+    def put(item) -> bool:
+        # block while the queue is full unless the encoder has stopped
+        while encoder.is_alive():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    encoder = threading.Thread(target=encode, daemon=True)
+    encoder.start()
+    count = 0
+    produce_time = 0.0
+    end = _RenderAborted
+    try:
+        for frame, t in produced:
+            if not put(frame):
+                break
+            count += 1
+            produce_time += t
+        end = None
+    finally:
+        produced.close()
+        put(end)
+        encoder.join()
+    if encoder_state['error'] is not None:
+        raise encoder_state['error']
+
+    stats = RenderStats(frames=count,
+                        wall_time=time.perf_counter() - start,
+                        produce_time=produce_time,
+                        encode_time=encoder_state['time'])
+    logging.info("render | %d frames | %.1f fps | produce %.3fs/frame | "
+                 "encode %.3fs/frame"
+                 % (count, count / max(stats.wall_time, 1e-9),
+                    produce_time / max(count, 1),
+                    stats.encode_time / max(count, 1)))
+    return stats
@@ -1,42 +1,134 @@
+import os
+import logging
 import numpy as np
-from typing import List
+from math import ceil
+from functools import partial
+from itertools import chain
+from collections import OrderedDict
+from typing import Iterable, Iterator, Tuple, List, Union
+from .io import read, _discretize, _continuous, _map_ordered
+from .transform import rescale, ResizeFilter, ResizeFilterName
+from ._log import _log_msg
 
+# 8-bit thumbnails kept by contact_sheet (see _thumbnail)
+_THUMBNAIL_CACHE_SIZE = 64 * 2**20
+_thumbnail_cache = OrderedDict()
 
-def image_grid(images: List[np.ndarray], w: int, h: int, b: int,
-               color: np.ndarray = None) -> np.ndarray:
+
+def _peek_images(images: Iterable[np.ndarray], count: int
+                 ) -> Tuple[np.ndarray, Iterator[np.ndarray]]:
+    """Return the first image and an iterator over exactly count images.
+
+    Args:
+        images (Iterable[np.ndarray]): Images (possibly lazy).
+        count (int): Number of images required.
+
+    Returns:
+        Tuple[np.ndarray, Iterator[np.ndarray]]: First image and iterator \
+            over all of the images (including the first).
+    """
+    images = iter(images)
+    first = next(images, None)
+    if first is None:
+        raise ValueError("Provide at least one image.")
+
+    def exactly(images):
+        i = 0
+        for i, image in enumerate(images, 1):
+            if i > count:
+                break
+            yield image
+        if i < count:
+            raise ValueError(f"Expected {count} images but got {i}.")
+
+    return first, exactly(chain([first], images))
+
+
+def image_grid(images: Iterable[np.ndarray], w: int, h: int, b: int,
+               color: np.ndarray = None, out: np.ndarray = None) -> np.ndarray:
     """Create a w * h grid of images with a border of width b.
 
+    Images are consumed one at a time, so they can be given lazily (such as
+    a generator or FrameSequence). To build a grid larger than memory, pass
+    an :code:`np.memmap` of the grid's shape as out (or see
+    :code:`write_image_grid`).
+
     Args:
-        images (List[np.ndarray]): images (of same dimension) for grid.
+        images (Iterable[np.ndarray]): images (of same dimension) for grid.
         w (int): number of images in each row of the grid.
         h (int): number of images in each column of the grid.
         b (int): width of the border/margin.
         color (np.ndarray): Pixel to use for bordering. Defaults to white.
+        out (np.ndarray): Array to write the grid into. Defaults to None.
 
     Returns:
         np.ndarray: grid layout of the images.
     """
-    n,m,*k = images[0].shape
-    if len(k) == 0:
-        color = 1 if color is None else color
-        h_border = np.full((b, w*m + (w+1)*b), color)
-        v_border = np.full((n, b), color)
+    first, images = _peek_images(images, w*h)
+    n,m,*k = first.shape
+    if color is None:
+        color = 1 if len(k) == 0 else np.ones(k[0])
+    shape = (h*n + (h+1)*b, w*m + (w+1)*b, *k)
+    if out is None:
+        dtype = np.result_type(first, np.asarray(color))
+        grid_layout = np.empty(shape, dtype=dtype)
+    elif out.shape != shape:
+        raise ValueError(f"out must have shape {shape}.")
     else:
-        k = k[0]
-        color = np.ones(k) if color is None else color
-        h_border = np.full((b, w*m + (w+1)*b, k), color)
-        v_border = np.full((n, b, k), color)
-    grid_layout = h_border
-    for i in range(h):
-        row = v_border
-        for j in range(w):
-            row = np.hstack((row, images[(i*w) + j]))
-            row = np.hstack((row, v_border))
-        grid_layout = np.vstack((grid_layout, row))
-        grid_layout = np.vstack((grid_layout, h_border))
+        grid_layout = out
+    # fill the border color once and copy every image into place once
+    grid_layout[...] = color
+    for index, image in enumerate(images):
+        i, j = divmod(index, w)
+        y = b + i*(n+b)
+        x = b + j*(m+b)
+        grid_layout[y:y+n, x:x+m] = image
     return grid_layout
 
 
+def write_image_grid(images: Iterable[np.ndarray], w: int, h: int, b: int,
+                     path: str, k: int = 255, color: np.ndarray = None):
+    """Write a w * h grid of images with a border of width b to a Netpbm file.
+
+    The grid is written to a raw (binary) pgm or ppm file one row of images
+    at a time, so at most one row of the grid is held in memory. Images are
+    consumed one at a time (see :code:`image_grid`).
+
+    Args:
+        images (Iterable[np.ndarray]): images (of same dimension) for grid.
+        w (int): number of images in each row of the grid.
+        h (int): number of images in each column of the grid.
+        b (int): width of the border/margin.
+        path (str): String file path.
+        k (int): Maximum color/gray value (at most 255). Defaults to 255.
+        color (np.ndarray): Pixel to use for bordering. Defaults to white.
+    """
+    if not 0 < k < 256:
+        raise ValueError("k must be in [1, 255].")
+    first, images = _peek_images(images, w*h)
+    n,m,*c = first.shape
+    if c not in ([], [3]):
+        raise ValueError("Only grayscale and three channel images can be "
+                         "written to a Netpbm file.")
+    if color is None:
+        color = 1 if len(c) == 0 else np.ones(c[0])
+    width = w*m + (w+1)*b
+    height = h*n + (h+1)*b
+    # one band is the border above a row of images and the row of images
+    band = np.empty((b + n, width, *c))
+    band[...] = color
+    with open(path, "wb") as f:
+        f.write(b"P%d\n%d %d\n%d\n" % (6 if c else 5, width, height, k))
+        for index, image in enumerate(images):
+            i, j = divmod(index, w)
+            x = b + j*(m+b)
+            band[b:, x:x+m] = image
+            if j == w - 1:
+                f.write(_discretize(band, k).astype(np.uint8).tobytes())
+        f.write(_discretize(band[:b], k).astype(np.uint8).tobytes())
+    logging.info(_log_msg(path, os.stat(path).st_size))
+
+
 def border(image: np.ndarray, b: int, color: np.ndarray = None) -> np.ndarray:
     """Add a border of width b to the image.
 
@@ -49,3 +141,109 @@ def border(image: np.ndarray, b: int, color: np.ndarray = None) -> np.ndarray:
         np.ndarray: Image with border added.
     """
     return image_grid([image], w=1, h=1, b=b, color=color)
+
+
+def _thumbnail(path: str, cell_w: int, cell_h: int,
+               filter: Union[ResizeFilterName, ResizeFilter],
+               color: np.ndarray) -> np.ndarray:
+    """Return the image fit (preserving aspect ratio) and centered in a cell.
+
+    Args:
+        path (str): String file path of the image.
+        cell_w (int): Width of the cell (in pixels).
+        cell_h (int): Height of the cell (in pixels).
+        filter (Union[ResizeFilterName, ResizeFilter]): Resize filter to use.
+        color (np.ndarray): Three channel pixel to fill the cell with.
+
+    Returns:
+        np.ndarray: Three channel 8-bit image of shape (cell_h, cell_w, 3).
+    """
+    image = read(path)
+    if len(image.shape) == 2:
+        image = np.stack(3 * (image,), axis=-1)
+    image = image[:,:,:3]
+    n,m,_ = image.shape
+    scale = min(cell_w / m, cell_h / n)
+    w = min(max(round(m * scale), 1), cell_w)
+    h = min(max(round(n * scale), 1), cell_h)
+    if (w, h) != (m, n):
+        image = rescale(image, w=w, h=h, filter=filter)
+    cell = np.empty((cell_h, cell_w, 3))
+    cell[...] = color
+    y = (cell_h - h) // 2
+    x = (cell_w - w) // 2
+    cell[y:y+h, x:x+w] = image
+    return _discretize(cell, 255).astype(np.uint8)
+
+
+def clear_thumbnail_cache():
+    """Remove every thumbnail cached by contact_sheet."""
+    _thumbnail_cache.clear()
+
+
+def contact_sheet(paths: List[str], cell_w: int, cell_h: int, w: int,
+                  b: int = 0, color: np.ndarray = None,
+                  filter: Union[ResizeFilterName, ResizeFilter] =
+                  ResizeFilterName.TRIANGLE, workers: int = None,
+                  processes: bool = True,
+                  cache_size: int = _THUMBNAIL_CACHE_SIZE) -> np.ndarray:
+    """Create a contact sheet of thumbnails of images of any size.
+
+    Each image is read and rescaled (preserving its aspect ratio) to fit a
+    cell_w * cell_h cell in a pool of workers. The cells are arranged w to a
+    row with a border of width b (see :code:`image_grid`). Thumbnails are
+    discretized to 8 bits and the most recently used are cached (up to
+    cache_size bytes in total), so an image which appears again (in this or
+    a later contact sheet) is only read and rescaled once. Use
+    :code:`clear_thumbnail_cache` to free the cache.
+
+    Args:
+        paths (List[str]): String file paths of the images.
+        cell_w (int): Width of each cell (in pixels).
+        cell_h (int): Height of each cell (in pixels).
+        w (int): number of images in each row of the contact sheet.
+        b (int): width of the border/margin. Defaults to 0.
+        color (np.ndarray): Three channel pixel to use for bordering and \
+            for the margins of the cells. Defaults to white.
+        filter (Union[ResizeFilterName, ResizeFilter]): Resize filter to use. \
+            Defaults to TRIANGLE.
+        workers (int): Number of workers. Defaults to the number of CPUs.
+        processes (bool): Use a process pool rather than a thread pool. \
+            Defaults to True.
+        cache_size (int): Maximum number of bytes of thumbnails to keep \
+            cached after returning (0 disables the cache). Defaults to 64 MiB.
+
+    Returns:
+        np.ndarray: Three channel contact sheet.
+    """
+    color = np.ones(3) if color is None else color
+
+    def key(path):
+        return (os.path.abspath(path), os.stat(path).st_mtime_ns, cell_w,
+                cell_h, filter, tuple(np.ravel(color)))
+
+    keys = [key(path) for path in paths]
+    missing = {k: path for k, path in zip(keys, paths)
+               if k not in _thumbnail_cache}
+    f = partial(_thumbnail, cell_w=cell_w, cell_h=cell_h, filter=filter,
+                color=color)
+    thumbnails = dict(zip(missing, _map_ordered(f, list(missing.values()),
+                                                workers=workers,
+                                                processes=processes)))
+    for k in keys:
+        if k in thumbnails:
+            _thumbnail_cache[k] = thumbnails[k]
+        else:
+            thumbnails[k] = _thumbnail_cache[k]
+        _thumbnail_cache.move_to_end(k)
+    total = sum(t.nbytes for t in _thumbnail_cache.values())
+    while total > cache_size:
+        _, thumbnail = _thumbnail_cache.popitem(last=False)
+        total -= thumbnail.nbytes
+
+    h = ceil(len(paths) / w)
+    blank = np.empty((cell_h, cell_w, 3))
+    blank[...] = color
+    cells = chain((_continuous(thumbnails[k], 255) for k in keys),
+                  [blank] * (w*h - len(paths)))
+    return image_grid(cells, w, h, b, color)
@@ -1,13 +1,20 @@
 import os
 import sys
 import re
+import threading
 import numpy as np
 import pkgutil
 from datetime import datetime
 from imageio import imread, imwrite
 from PIL import PngImagePlugin
-from typing import List
+from typing import List, Tuple, Union, Callable, Iterator
+from collections import deque
+from itertools import islice
+from functools import partial
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from ._log import _log_msg
+from .transform import unpremultiply
 import logging
 
 
@@ -141,25 +148,147 @@ def _discretize(image: np.ndarray, k: int) -> np.ndarray:
     return np.ceil(k*image - 0.5).astype(int)
 
 
-def _get_next_version(path: str) -> str:
-    """Return the name with the next highest version number.
+# cache of the highest version number claimed for each (directory, basename)
+_version_cache = {}
+_version_lock = threading.Lock()
+
+
+def _split_version_path(path: str) -> Tuple[str, str, str, str]:
+    """Split a file path into the parts used for versioning.
 
     Args:
-        name (str): String file path
+        path (str): String file path.
 
     Returns:
-        str: String file path with version number.
+        Tuple[str, str, str, str]: Directory, root, basename, and extension.
     """
-    filenames = os.scandir(max(os.path.dirname(path), '.'))
+    directory = os.path.dirname(path) or '.'
     root, ext = os.path.splitext(path)
     basename = os.path.basename(root)
+    return directory, root, basename, ext
+
+
+def _scan_versions(directory: str, basename: str) -> Tuple[int, str]:
+    """Scan a directory for the highest version number of the basename.
+
+    Args:
+        directory (str): String directory path.
+        basename (str): Name of the file without version or extension.
+
+    Returns:
+        Tuple[int, str]: Highest version number and the name of that file.
+    """
     # match if no extension or any of the dmtools supported file formats
     r = re.compile(f"{re.escape(basename)}_([0-9]+)(|.png|.pgm|.pbm|.ppm)")
-    prev = (int(m[1]) for m in (r.match(f.name) for f in filenames) if m)
-    i = 1 + max(prev, default=0)
+    i, name = 0, None
+    with os.scandir(directory) as filenames:
+        for f in filenames:
+            m = r.match(f.name)
+            if m and int(m[1]) > i:
+                i, name = int(m[1]), f.name
+    return i, name
+
+
+def _latest_version(directory: str, basename: str) -> int:
+    """Return the highest version number of the basename in the directory.
+
+    The directory is only scanned if it was modified by someone else since the
+    last scan or claim or if the most recent version was removed. Otherwise,
+    the cached high-water mark is returned.
+
+    Args:
+        directory (str): String directory path.
+        basename (str): Name of the file without version or extension.
+
+    Returns:
+        int: Highest version number (0 if there are no versions).
+    """
+    key = (os.path.abspath(directory), basename)
+    mtime = os.stat(directory).st_mtime_ns
+    entry = _version_cache.get(key)
+    if entry is not None:
+        cached_mtime, i, name = entry
+        if cached_mtime == mtime and \
+           (name is None or os.path.exists(os.path.join(directory, name))):
+            return i
+    i, name = _scan_versions(directory, basename)
+    _version_cache[key] = (mtime, i, name)
+    return i
+
+
+def _get_next_version(path: str) -> str:
+    """Return the name with the next highest version number.
+
+    The name is not reserved. Use :code:`_claim_next_version` to reserve it.
+
+    Args:
+        path (str): String file path.
+
+    Returns:
+        str: String file path with version number.
+    """
+    directory, root, basename, ext = _split_version_path(path)
+    with _version_lock:
+        i = 1 + _latest_version(directory, basename)
     return f"{root}_{i:04}{ext}"
 
 
+def _claim_next_version(path: str) -> str:
+    """Reserve and return the name with the next highest version number.
+
+    The versioned file is created atomically (:code:`O_EXCL`) so concurrent
+    writers in other threads or processes never receive the same name.
+
+    Args:
+        path (str): String file path.
+
+    Returns:
+        str: String file path with version number.
+    """
+    directory, root, basename, ext = _split_version_path(path)
+    with _version_lock:
+        i = _latest_version(directory, basename)
+        while True:
+            i += 1
+            versioned_path = f"{root}_{i:04}{ext}"
+            try:
+                fd = os.open(versioned_path,
+                             os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                continue
+            os.close(fd)
+            break
+        key = (os.path.abspath(directory), basename)
+        mtime = os.stat(directory).st_mtime_ns
+        _version_cache[key] = (mtime, i, os.path.basename(versioned_path))
+    return versioned_path
+
+
+@contextmanager
+def _output_path(path: str, versioning: bool) -> Iterator[str]:
+    """Yield the path to write to, claiming a versioned name if versioning.
+
+    A claimed file is removed again if writing it fails so that no empty
+    versioned files are left behind.
+
+    Args:
+        path (str): String file path.
+        versioning (bool): Version files (rather than overwrite).
+    """
+    if not versioning:
+        yield path
+        return
+    path = _claim_next_version(path)
+    try:
+        yield path
+    except BaseException:
+        with _version_lock:
+            os.remove(path)
+            directory, _, basename, _ = _split_version_path(path)
+            _version_cache.pop((os.path.abspath(directory), basename), None)
+        raise
+
+
 def read_png(path: str) -> np.ndarray:
     """Read a png file into a NumPy array.
 
@@ -173,7 +302,8 @@ def read_png(path: str) -> np.ndarray:
     return _continuous(image, 255)
 
 
-def write_png(image: np.ndarray, path: str, versioning=False, metadata=None):
+def write_png(image: np.ndarray, path: str, versioning=False, metadata=None,
+              premultiplied=False):
     """Write NumPy array to a png file.
 
     The NumPy array should have values in the range [0, 1].
@@ -184,12 +314,15 @@ def write_png(image: np.ndarray, path: str, versioning=False, metadata=None):
         path (str): String file path.
         versioning (bool): Version files (rather than overwrite).
         metadata (Metadata): Metadata for image. Defaults to Metadata().
+        premultiplied (bool): True if image is a premultiplied RGBA image \
+            (see transform.premultiply). Defaults to False.
     """
-    if versioning:
-        path = _get_next_version(path)
-    im = _discretize(image, 255).astype(np.uint8)
+    if premultiplied:
+        image = unpremultiply(image)
     metadata = Metadata() if metadata is None else metadata
-    imwrite(im=im, uri=path, format='png', pnginfo=metadata._to_pnginfo())
+    with _output_path(path, versioning) as path:
+        im = _discretize(image, 255).astype(np.uint8)
+        imwrite(im=im, uri=path, format='png', pnginfo=metadata._to_pnginfo())
 
 
 def _parse_ascii_netpbm(f: List[str]) -> np.ndarray:
@@ -328,8 +461,6 @@ def write_netpbm(image: np.ndarray, k: int, path: str,
         versioning (bool): Version files (rather than overwrite).
         metadata (Metadata): Metadata for image. Defaults to Metadata().
     """
-    if versioning:
-        path = _get_next_version(path)
     metadata = Metadata() if metadata is None else metadata
     h, w, *_ = image.shape
     if len(image.shape) == 2:
@@ -338,7 +469,7 @@ def write_netpbm(image: np.ndarray, k: int, path: str,
         P = 3
     if P == 1:
         image = -image + 1
-    with open(path, "w") as f:
+    with _output_path(path, versioning) as path, open(path, "w") as f:
         f.write('P%d\n' % P)
         f.write("%s %s\n" % (w, h))
         if P != 1:
@@ -409,6 +540,108 @@ def read(path: str) -> np.ndarray:
         return read_f[ext](path)
 
 
+def _call_with(f: Callable, args: tuple, kwargs: dict, x):
+    return f(x, *args, **kwargs)
+
+
+def _bind_args(f: Callable, *args, **kwargs) -> Callable:
+    """Return f taking its first argument with the given remaining arguments.
+
+    Unlike a lambda, the returned callable can be pickled if f can.
+    """
+    if not args and not kwargs:
+        return f
+    return partial(_call_with, f, args, kwargs)
+
+
+def _map_ordered(f: Callable, items: List, workers: int = None,
+                 prefetch: int = None, processes: bool = False) -> Iterator:
+    """Apply f to every item in a worker pool, yielding results in order.
+
+    At most prefetch results are in flight at any time so memory stays bounded
+    when the consumer is slower than the workers.
+
+    Args:
+        f (Callable): Function to apply. Must be picklable if processes.
+        items (List): Items to apply f to.
+        workers (int): Number of workers. Defaults to the number of CPUs.
+        prefetch (int): Maximum results in flight. Defaults to 2 * workers.
+        processes (bool): Use a process pool rather than a thread pool.
+
+    Yields:
+        The result of f on each item (in order).
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        for item in items:
+            yield f(item)
+        return
+    prefetch = 2 * workers if prefetch is None else max(prefetch, 1)
+    Executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with Executor(max_workers=workers) as executor:
+        items = iter(items)
+        pending = deque(executor.submit(f, item)
+                        for item in islice(items, prefetch))
+        try:
+            while pending:
+                result = pending.popleft().result()
+                for item in islice(items, 1):
+                    pending.append(executor.submit(f, item))
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def read_iter(paths: List[str], workers: int = None, prefetch: int = None,
+              processes: bool = False) -> Iterator[np.ndarray]:
+    """Read image files in parallel, yielding images in order.
+
+    Images are decoded ahead of the consumer by a pool of workers. At most
+    prefetch decoded images are held in the queue at any time.
+
+    Args:
+        paths (List[str]): String file paths (see :code:`read`).
+        workers (int): Number of workers. Defaults to the number of CPUs.
+        prefetch (int): Maximum images decoded ahead of the consumer. \
+            Defaults to 2 * workers.
+        processes (bool): Decode in a process pool rather than a thread pool.
+
+    Yields:
+        np.ndarray: NumPy array representing each image.
+    """
+    return _map_ordered(read, paths, workers, prefetch, processes)
+
+
+def read_many(paths: List[str], workers: int = None, prefetch: int = None,
+              processes: bool = False,
+              out: np.ndarray = None) -> Union[List[np.ndarray], np.ndarray]:
+    """Read image files in parallel.
+
+    Args:
+        paths (List[str]): String file paths (see :code:`read`).
+        workers (int): Number of workers. Defaults to the number of CPUs.
+        prefetch (int): Maximum images decoded ahead of the consumer. \
+            Defaults to 2 * workers.
+        processes (bool): Decode in a process pool rather than a thread pool.
+        out (np.ndarray): Preallocated array of shape (frames, h, w, c) or \
+            (frames, h, w) to read the images into. Defaults to None.
+
+    Returns:
+        Union[List[np.ndarray], np.ndarray]: List of NumPy arrays \
+            representing images (or out if it was given).
+    """
+    images = read_iter(paths, workers, prefetch, processes)
+    if out is None:
+        return list(images)
+    if len(out) != len(paths):
+        raise ValueError("out must have one entry for every path.")
+    for i, image in enumerate(images):
+        out[i] = image
+    return out
+
+
 def recreate_script_from_png(image_path: str, script_path: str):
     """Recreate a script from the metadata of a PNG file.
 
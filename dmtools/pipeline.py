@@ -0,0 +1,156 @@
+import numpy as np
+from typing import Callable, List, Tuple, Union
+from . import colorspace, transform, adjustments
+from .io import read, write_png, _bind_args
+
+
+# functions computing each pixel from the same pixel of their input only
+_ELEMENTWISE = {
+    colorspace.RGB_to_gray, colorspace.gray_to_RGB, colorspace.add_alpha,
+    colorspace.RGB_to_XYZ, colorspace.XYZ_to_RGB, colorspace.RGB_to_YUV,
+    colorspace.YUV_to_RGB, colorspace.XYZ_to_Lab, colorspace.Lab_to_XYZ,
+    colorspace.RGB_to_Lab, colorspace.Lab_to_RGB, colorspace.normalize,
+    colorspace.denormalize, transform.clip, transform.wraparound,
+    transform.premultiply, transform.unpremultiply, adjustments.apply_curve,
+    adjustments.apply_curves}
+
+
+class Pipeline:
+    """A lazy chain of operations on an image.
+
+    Operations are only recorded until the pipeline is run. Consecutive
+    elementwise operations (those computing each pixel from the same pixel of
+    their input, like the colorspace conversions, clip, and apply_curve) are
+    fused: the image is split into tiles of rows and the whole run of
+    operations is applied to one tile at a time. Hence, the intermediate
+    images of the run are only ever tile sized. Any other operation (like
+    rescale or blur) is applied to the entire image.
+
+    For example, the following only materializes the rescaled image and the
+    result.
+
+    .. code-block:: python
+
+        image = (Pipeline(image)
+                 .map(transform.rescale, k=2)
+                 .map(colorspace.RGB_to_Lab)
+                 .map(adjustments.apply_curve, f, c=0)
+                 .map(colorspace.Lab_to_RGB)
+                 .map(transform.clip)
+                 .run())
+    """
+
+    def __init__(self, source: Union[np.ndarray, str], tile_size: int = 16384,
+                 ops: List[Tuple[Callable, bool]] = None):
+        """Initialize a pipeline.
+
+        Args:
+            source (Union[np.ndarray, str]): Image or string file path of the \
+                image to run the pipeline on.
+            tile_size (int): Number of pixels in a tile. Defaults to 16384.
+            ops (List[Tuple[Callable, bool]]): Functions applied to the image \
+                (in order) and whether they are elementwise. Defaults to None.
+        """
+        self.source = source
+        self.tile_size = tile_size
+        self._ops = [] if ops is None else list(ops)
+
+    def _append(self, f: Callable, elementwise: bool, *args,
+                **kwargs) -> 'Pipeline':
+        return Pipeline(source=self.source, tile_size=self.tile_size,
+                        ops=self._ops + [(_bind_args(f, *args, **kwargs),
+                                          elementwise)])
+
+    def map(self, f: Callable, *args, **kwargs) -> 'Pipeline':
+        """Return a pipeline with f applied to the image.
+
+        The transform, colorspace, and adjustments functions which are
+        elementwise are fused with their neighbors. Any other function is
+        applied to the entire image (see pointwise).
+
+        Args:
+            f (Callable): Function taking an image as its first argument.
+            *args: Additional positional arguments to f.
+            **kwargs: Additional keyword arguments to f.
+
+        Returns:
+            Pipeline: Pipeline with f applied.
+        """
+        return self._append(f, f in _ELEMENTWISE, *args, **kwargs)
+
+    def pointwise(self, f: Callable, *args, **kwargs) -> 'Pipeline':
+        """Return a pipeline with the elementwise function f applied.
+
+        Use this for functions not known to the pipeline which compute each
+        pixel from the same pixel of their input. f must not modify its input.
+
+        Args:
+            f (Callable): Function taking an image as its first argument.
+            *args: Additional positional arguments to f.
+            **kwargs: Additional keyword arguments to f.
+
+        Returns:
+            Pipeline: Pipeline with f applied.
+        """
+        return self._append(f, True, *args, **kwargs)
+
+    def _stages(self) -> List[Tuple[bool, List[Callable]]]:
+        """Group the operations into fused elementwise runs and others."""
+        stages = []
+        for op, elementwise in self._ops:
+            if elementwise and stages and stages[-1][0]:
+                stages[-1][1].append(op)
+            else:
+                stages.append((elementwise, [op]))
+        return stages
+
+    def _run_tiles(self, image: np.ndarray, ops: List[Callable],
+                   out: np.ndarray = None) -> np.ndarray:
+        """Apply the elementwise operations to the image one tile at a time."""
+        n,m,*_ = image.shape
+        rows = max(1, self.tile_size // m)
+        for y in range(0, n, rows):
+            tile = image[y:y+rows]
+            for op in ops:
+                tile = op(tile)
+            if tile.shape[:2] != (min(rows, n - y), m):
+                raise ValueError("Elementwise operations must preserve the "
+                                 "dimensions of the image.")
+            if out is None:
+                out = np.empty((n,m) + tile.shape[2:], dtype=tile.dtype)
+            out[y:y+rows] = tile
+        return out
+
+    def run(self, out: np.ndarray = None) -> np.ndarray:
+        """Run the pipeline and return the resulting image.
+
+        Args:
+            out (np.ndarray): Array to write the result into. Defaults to a \
+                new array.
+
+        Returns:
+            np.ndarray: The resulting image.
+        """
+        image = self.source
+        if isinstance(image, str):
+            image = read(image)
+        stages = self._stages()
+        for i, (elementwise, ops) in enumerate(stages):
+            last = (i == len(stages) - 1)
+            if elementwise:
+                image = self._run_tiles(image, ops, out if last else None)
+            else:
+                image = ops[0](image)
+        if out is not None and image is not out:
+            out[...] = image
+            image = out
+        return image
+
+    def write_png(self, path: str, **kwargs):
+        """Run the pipeline and write the resulting image to a png file.
+
+        Args:
+            path (str): String file path.
+            **kwargs: Additional keyword arguments to io.write_png.
+        """
+        write_png(self.run(), path, **kwargs)
@@ -1,36 +1,411 @@
+import struct
 import numpy as np
+from math import gcd
 from scipy.io import wavfile
+from scipy.signal import resample_poly
+from typing import Union, Iterator, Iterable, List, Tuple
+from collections import namedtuple
 
 # https://en.wikipedia.org/wiki/44,100_Hz
 SAMPLE_RATE = 44100
 
 
+def _convert_samples(samples: np.ndarray, out: np.ndarray,
+                     scratch: np.ndarray = None):
+    """Convert samples into out, scaling between sample formats.
+
+    Float samples are in [-1,1] and integer samples span the range of their
+    type. Samples are copied without scaling if both formats are float or if
+    the formats are the same.
+
+    Args:
+        samples (np.ndarray): Samples to convert.
+        out (np.ndarray): Array (of the destination format) to write into.
+        scratch (np.ndarray): Float buffer at least as long as samples. \
+            Defaults to a new buffer.
+    """
+    samples = np.asarray(samples)
+    src, dst = samples.dtype, out.dtype
+    if src == dst or (src.kind == 'f' and dst.kind == 'f'):
+        np.copyto(out, samples, casting='unsafe')
+        return
+    if scratch is None:
+        scratch = np.empty(samples.shape)
+    else:
+        scratch = scratch[:len(samples)]
+    if src.kind == 'f':
+        np.copyto(scratch, samples)
+    else:
+        np.divide(samples, np.iinfo(src).max, out=scratch)
+    if dst.kind == 'i':
+        np.clip(scratch, -1, 1, out=scratch)
+        scratch *= np.iinfo(dst).max
+        np.rint(scratch, out=scratch)
+    np.copyto(out, scratch, casting='unsafe')
+
+
+def _is_unsupported_integer(samples: np.ndarray) -> bool:
+    return samples.dtype.kind in 'iu' and \
+        samples.dtype.name not in ('int16', 'int32')
+
+
+def _integer_pcm(r: np.ndarray, l: np.ndarray,
+                 dtype: str = None) -> Tuple[np.ndarray, np.ndarray, str]:
+    """Resolve integer channels of unsupported types to one PCM format.
+
+    If either channel has integer samples of an unsupported type (such as
+    int64), the integer samples of both channels are kept as they are (not
+    scaled) in a single integer format: dtype if given, otherwise the
+    supported integer format of the other channel, otherwise int32. The
+    channels are returned unchanged otherwise.
+
+    Args:
+        r (np.ndarray): Samples of the right channel.
+        l (np.ndarray): Samples of the left channel.
+        dtype (str): Sample format of the sound. Defaults to None.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, str]: Channels and sample format.
+    """
+    r, l = np.asarray(r), np.asarray(l)
+    if not (_is_unsupported_integer(r) or _is_unsupported_integer(l)):
+        return r, l, dtype
+    if dtype is None:
+        supported = [c.dtype for c in (r, l)
+                     if c.dtype.name in ('int16', 'int32')]
+        dtype = supported[0] if supported else np.int32
+    dtype = np.dtype(dtype)
+    if dtype.kind != 'i':
+        raise ValueError("Integer samples of unsupported types can only be "
+                         "stored in an integer format.")
+    info = np.iinfo(dtype)
+    channels = []
+    for c in (r, l):
+        if c.dtype.kind in 'iu':
+            if c.size and (c.min() < info.min or c.max() > info.max):
+                raise ValueError(f"{c.dtype.name} samples must be in the "
+                                 f"{dtype.name} range [{info.min}, "
+                                 f"{info.max}].")
+            c = c.astype(dtype)
+        channels.append(c)
+    return channels[0], channels[1], dtype
+
+
 class WAV:
     """An object representing a WAV audio file.
 
+    The samples are stored in one contiguous interleaved array
+    :code:`samples` of shape (n, channels) in a single sample format (such as
+    int16 or float32). The right and left channels :code:`r` and :code:`l`
+    are strided views of it, so the sound can be written to a file of the
+    same format without copying.
+
     For more information about the audio file format, see
     `WAV <https://en.wikipedia.org/wiki/WAV>`_
     """
     def __init__(self, r: np.ndarray, l: np.ndarray,
-                 sample_rate: int = SAMPLE_RATE):
+                 sample_rate: int = SAMPLE_RATE, dtype: str = None):
         """Initialize a WAV sound.
 
+        Float samples should be in [-1,1]. Samples are scaled when converted
+        between integer and float formats. Integer samples of other types
+        (such as int64) are stored as they are, along with any integer
+        samples of the other channel, in one integer format.
+
         Args:
             r (np.ndarray): NumPy array of samples of the right channel.
             l (np.ndarray): NumPy array of samples of the left channel.
             sample_rate (int): Sample rate. Defaults to SAMPLE_RATE.
+            dtype (str): Sample format in {int16, int32, float32, float64}. \
+                Defaults to the format of r and l if it is supported, int32 \
+                for other integer samples, and float64 otherwise.
         """
-        self.r = r
-        self.l = l
+        r, l, dtype = _integer_pcm(r, l, dtype)
+        if r.ndim != 1 or r.shape != l.shape:
+            raise ValueError("The channels must be 1D arrays of the same "
+                             "length.")
+        if dtype is None:
+            if r.dtype == l.dtype and r.dtype.name in WAVWriter._FORMAT_TAGS:
+                dtype = r.dtype
+            else:
+                dtype = np.float64
+        self.samples = np.empty((len(r), 2), dtype=dtype)
+        _convert_samples(r, self.samples[:,0])
+        _convert_samples(l, self.samples[:,1])
         self.sample_rate = sample_rate
 
-    def to_wav(self, path):
+    @classmethod
+    def from_samples(cls, samples: np.ndarray,
+                     sample_rate: int = SAMPLE_RATE) -> 'WAV':
+        """Return a WAV sound using the given samples without copying them.
+
+        Unsigned 8-bit samples (as in 8-bit WAV files) are converted to int16.
+        Samples of other unsupported formats raise a ValueError.
+
+        Args:
+            samples (np.ndarray): Interleaved samples of shape \
+                (n, channels) or the samples of a mono sound of shape (n,).
+            sample_rate (int): Sample rate. Defaults to SAMPLE_RATE.
+
+        Returns:
+            WAV: Wav file. A mono sound has the same samples in r and l.
+        """
+        if samples.dtype == np.uint8:
+            # 8-bit PCM is unsigned with a midpoint of 128
+            samples = (samples.astype(np.int16) - 128) * 256
+        elif samples.dtype.name not in WAVWriter._FORMAT_TAGS:
+            raise ValueError(f"{samples.dtype.name} is not a supported WAV "
+                             "format.")
+        sound = cls.__new__(cls)
+        sound.samples = samples if samples.ndim == 2 else samples[:,None]
+        sound.sample_rate = sample_rate
+        return sound
+
+    @property
+    def dtype(self) -> np.dtype:
+        """Sample format of the sound."""
+        return self.samples.dtype
+
+    @property
+    def r(self) -> np.ndarray:
+        """Samples of the right channel (a view of samples)."""
+        return self.samples[:,0]
+
+    @r.setter
+    def r(self, r: np.ndarray):
+        self.samples = WAV(r, self.l, dtype=self.dtype).samples
+
+    @property
+    def l(self) -> np.ndarray:  # noqa: E743
+        """Samples of the left channel (a view of samples)."""
+        return self.samples[:,-1]
+
+    @l.setter
+    def l(self, l: np.ndarray):  # noqa: E743
+        self.samples = WAV(self.r, l, dtype=self.dtype).samples
+
+    def resample(self, sample_rate: int) -> 'WAV':
+        """Return the sound resampled to a new sample rate.
+
+        Uses a polyphase filter (:code:`scipy.signal.resample_poly`) with the
+        smallest integer up and down factors.
+
+        Args:
+            sample_rate (int): New sample rate.
+
+        Returns:
+            WAV: Resampled sound (in the same sample format).
+        """
+        g = gcd(sample_rate, self.sample_rate)
+        up, down = sample_rate // g, self.sample_rate // g
+        samples = np.empty(self.samples.shape)
+        _convert_samples(self.samples, samples)
+        if up != down:
+            samples = resample_poly(samples, up, down, axis=0)
+        resampled = np.empty(samples.shape, dtype=self.dtype)
+        _convert_samples(samples, resampled)
+        return WAV.from_samples(resampled, sample_rate=sample_rate)
+
+    def frames_view(self, fps: int, size: int = None
+                    ) -> Union[np.ndarray, List[np.ndarray]]:
+        """Return zero-copy views of the samples of every animation frame.
+
+        The window of frame i starts at sample round(i * sample_rate / fps).
+        Windows which would extend past the end of the sound are dropped. The
+        views are read-only.
+
+        If sample_rate / fps is an integer, the windows are evenly spaced and
+        a single strided view of shape (frames, size, channels) is returned.
+        Otherwise (e.g. 44100 Hz at 24 fps), a list of views of shape
+        (size, channels) is returned.
+
+        Args:
+            fps (int): Frames per second of the animation.
+            size (int): Number of samples in every window. Defaults to \
+                round(sample_rate / fps) (windows do not overlap).
+
+        Returns:
+            Union[np.ndarray, List[np.ndarray]]: Read-only views of the \
+                samples of every frame.
+        """
+        size = round(self.sample_rate / fps) if size is None else size
+        n, channels = self.samples.shape
+        if self.sample_rate % fps == 0:
+            hop = self.sample_rate // fps
+            frames = max((n - size) // hop + 1, 0)
+            row, col = self.samples.strides
+            return np.lib.stride_tricks.as_strided(
+                self.samples, shape=(frames, size, channels),
+                strides=(hop * row, row, col), writeable=False)
+        views = []
+        i = 0
+        while round(i * self.sample_rate / fps) + size <= n:
+            start = round(i * self.sample_rate / fps)
+            view = self.samples[start:start + size]
+            view.flags.writeable = False
+            views.append(view)
+            i += 1
+        return views
+
+    def to_wav(self, path, dtype: str = None):
         """Write object to a WAV audio file (wav)
 
+        If dtype is the sample format of the sound, the samples are written
+        without a copy. Otherwise, they are converted in chunks (see
+        :code:`WAVWriter`).
+
+        Args:
+            path (str): String file path.
+            dtype (str): Sample format in {int16, int32, float32, float64}. \
+                Defaults to the sample format of the sound.
+        """
+        dtype = self.dtype if dtype is None else dtype
+        with WAVWriter(path, sample_rate=self.sample_rate,
+                       channels=self.samples.shape[1],
+                       dtype=dtype) as writer:
+            writer.write_samples(self.samples)
+
+
+class WAVWriter:
+    """Write a WAV audio file (wav) incrementally.
+
+    Blocks of samples are converted and interleaved in chunks through a
+    reused buffer and written as they are given. The sizes in the header are
+    filled in when the writer is closed, so a sound of any length (up to the
+    4 GiB limit of the WAV format) can be written in bounded memory. Samples
+    are scaled when converted between integer and float formats (see
+    :code:`WAV`).
+
+    .. code-block:: python
+
+        with WAVWriter("mix.wav", dtype='int16') as writer:
+            for block in mixer.blocks():
+                writer.write(block, block)
+    """
+
+    # WAV format tags: 1 is integer PCM and 3 is IEEE float
+    _FORMAT_TAGS = {'int16': 1, 'int32': 1, 'float32': 3, 'float64': 3}
+    # the RIFF size (the data and at most 50 bytes of header) is 32 bit
+    _MAX_DATA_SIZE = 2**32 - 1 - 50
+
+    def __init__(self, path: str, sample_rate: int = SAMPLE_RATE,
+                 channels: int = 2, dtype: str = 'int16',
+                 chunk_size: int = 65536):
+        """Initialize the writer and write a placeholder header.
+
         Args:
             path (str): String file path.
+            sample_rate (int): Sample rate. Defaults to SAMPLE_RATE.
+            channels (int): Number of channels. Defaults to 2.
+            dtype (str): Sample format in {int16, int32, float32, float64}. \
+                Defaults to int16.
+            chunk_size (int): Number of samples (per channel) converted at \
+                once. Defaults to 65536.
+        """
+        dtype = np.dtype(dtype)
+        if dtype.name not in self._FORMAT_TAGS:
+            raise ValueError(f"{dtype.name} is not a supported WAV format.")
+        self.path = path
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.dtype = dtype.newbyteorder('<')
+        self.chunk_size = chunk_size
+        self._buffer = np.empty((chunk_size, channels), dtype=self.dtype)
+        self._scratch = np.empty(chunk_size)
+        self._frames = 0
+        self._f = open(path, 'wb')
+        self._write_header()
+
+    def _write_header(self):
+        """Write the header (with the number of frames written so far)."""
+        tag = self._FORMAT_TAGS[self.dtype.name]
+        block_align = self.channels * self.dtype.itemsize
+        data_size = self._frames * block_align
+        fmt = struct.pack('<HHIIHH', tag, self.channels, self.sample_rate,
+                          self.sample_rate * block_align, block_align,
+                          8 * self.dtype.itemsize)
+        if tag == 3:
+            # non-PCM formats have an extension size and a fact chunk
+            fmt += struct.pack('<H', 0)
+            fact = b'fact' + struct.pack('<II', 4, self._frames)
+        else:
+            fact = b''
+        header = (b'WAVE' + b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+                  + fact + b'data' + struct.pack('<I', data_size))
+        self._f.write(b'RIFF' + struct.pack('<I', len(header) + data_size)
+                      + header)
+
+    def _check_size(self, n: int):
+        """Raise if n more frames would not fit in the sizes of the header."""
+        data_size = (self._frames + n) * self.channels * self.dtype.itemsize
+        if data_size > self._MAX_DATA_SIZE:
+            raise ValueError("WAV files can hold at most 4 GiB of samples.")
+
+    def write(self, *channels: np.ndarray):
+        """Write a block of samples.
+
+        Args:
+            *channels (np.ndarray): Samples of each channel (same length).
+        """
+        if len(channels) != self.channels:
+            raise ValueError(f"Provide samples for {self.channels} channels.")
+        n = len(channels[0])
+        if any(len(c) != n for c in channels):
+            raise ValueError("Every channel must have the same length.")
+        self._check_size(n)
+        for i in range(0, n, self.chunk_size):
+            m = min(self.chunk_size, n - i)
+            chunk = self._buffer[:m]
+            for c, samples in enumerate(channels):
+                _convert_samples(samples[i:i+m], chunk[:,c], self._scratch)
+            self._f.write(chunk.data)
+        self._frames += n
+
+    def write_samples(self, samples: np.ndarray):
+        """Write a block of interleaved samples.
+
+        Samples already in the sample format of the file are written without
+        a copy.
+
+        Args:
+            samples (np.ndarray): Interleaved samples of shape (n, channels).
         """
-        wavfile.write(path, self.sample_rate, np.array([self.r, self.l]).T)
+        if samples.ndim != 2 or samples.shape[1] != self.channels:
+            raise ValueError(f"Provide samples for {self.channels} channels.")
+        if samples.dtype == self.dtype and samples.flags['C_CONTIGUOUS']:
+            self._check_size(len(samples))
+            self._f.write(samples.data)
+            self._frames += len(samples)
+        else:
+            self.write(*samples.T)
+
+    def close(self):
+        """Fill in the header and close the file."""
+        self._f.seek(0)
+        self._write_header()
+        self._f.close()
+
+    def __enter__(self) -> 'WAVWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_wav(path: str, mmap: bool = False) -> WAV:
+    """Read a WAV audio file (wav).
+
+    Args:
+        path (str): String file path.
+        mmap (bool): Memory-map the samples rather than reading them. The \
+            samples are then a zero-copy (read-only) view of the file. \
+            Defaults to False.
+
+    Returns:
+        WAV: Wav file. Mono files have the same samples in both channels.
+    """
+    sample_rate, data = wavfile.read(path, mmap=mmap)
+    return WAV.from_samples(data, sample_rate=sample_rate)
 
 
 def wave(f: float, a: float, t: float) -> np.ndarray:
@@ -48,16 +423,287 @@ def wave(f: float, a: float, t: float) -> np.ndarray:
     return a*np.sin(sample_points*f)
 
 
-def wave_sequence(frequencies: np.ndarray, t) -> WAV:
+def wave_sequence(frequencies: np.ndarray, t: Union[float, np.ndarray],
+                  dtype: str = None) -> WAV:
     """Return a Wav sound which iterates through the given frequencies.
 
+    The samples of every segment are generated in a single vectorized pass.
+    The phase of the wave is continuous across segments so there are no
+    clicks when the frequency changes.
+
     Args:
         frequencies (np.ndarray): frequencies to iterate through.
-        t ([type]): duration of iteration.
+        t (Union[float, np.ndarray]): duration of iteration or the duration \
+            of each frequency.
+        dtype (str): sample format of the Wav file (see :code:`WAV`). \
+            Defaults to float64.
 
     Returns:
         WAV: Wav file.
     """
-    d = t / len(frequencies)
-    w = np.array([list(wave(f,1,d)) for f in frequencies]).flatten()
-    return WAV(r=w, l=w)
+    frequencies = np.asarray(frequencies, dtype=float)
+    if np.ndim(t) == 0:
+        durations = np.full(len(frequencies), t / len(frequencies))
+    else:
+        durations = np.asarray(t, dtype=float)
+        if durations.shape != frequencies.shape:
+            raise ValueError("Provide one duration for every frequency.")
+    # round segment boundaries (not lengths) so no time drift accumulates
+    bounds = np.rint(np.cumsum(durations) * SAMPLE_RATE).astype(int)
+    lengths = np.diff(bounds, prepend=0)
+    f = np.repeat(frequencies, lengths)
+    # phase at each sample is the running sum of the preceding frequencies
+    phase = np.cumsum(f)
+    phase -= f
+    phase *= 2 * np.pi / SAMPLE_RATE
+    w = np.sin(phase)
+    return WAV(r=w, l=w, dtype=dtype)
+
+
+Voice = namedtuple('Voice', 'f a start stop attack release')
+Voice.__doc__ = """\
+A sine oscillator voice of a Mixer.
+
+The amplitude of the voice ramps linearly from 0 to a over the attack and
+from a to 0 over the release at the end of the voice.
+
+Parameters:
+    f (float): Frequency of the sound wave.
+    a (float): Amplitude of the sound wave.
+    start (float): Start time (seconds) of the voice.
+    stop (float): Stop time (seconds) of the voice.
+    attack (float): Duration (seconds) of the attack.
+    release (float): Duration (seconds) of the release.
+"""
+
+
+class Mixer:
+    """An oscillator bank mixing many simultaneous sine voices.
+
+    The mix is rendered in fixed-size blocks. In every block, only the voices
+    sounding during the block are computed, all at once, into preallocated
+    buffers, so memory depends on the block size and the largest number of
+    voices sounding at once but not on the duration of the mix or the total
+    number of voices.
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE,
+                 block_size: int = 4096):
+        """Initialize an empty mixer.
+
+        Args:
+            sample_rate (int): Sample rate. Defaults to SAMPLE_RATE.
+            block_size (int): Number of samples rendered at once. \
+                Defaults to 4096.
+        """
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.voices = []
+
+    def add(self, f: float, a: float, start: float, stop: float,
+            attack: float = 0, release: float = 0):
+        """Add a voice to the mix (see :code:`Voice`).
+
+        Args:
+            f (float): Frequency of the sound wave.
+            a (float): Amplitude of the sound wave.
+            start (float): Start time (seconds) of the voice.
+            stop (float): Stop time (seconds) of the voice.
+            attack (float): Duration (seconds) of the attack. Defaults to 0.
+            release (float): Duration (seconds) of the release. Defaults to 0.
+        """
+        if stop < start:
+            raise ValueError("A voice must stop after it starts.")
+        self.voices.append(Voice(f, a, start, stop, attack, release))
+
+    def duration(self) -> float:
+        """Return the duration (seconds) of the mix."""
+        return max((v.stop for v in self.voices), default=0)
+
+    def blocks(self, t: float = None) -> Iterator[np.ndarray]:
+        """Render the mix block by block.
+
+        The same buffer is reused for every block, so copy a block to keep it
+        after the next block is requested.
+
+        Args:
+            t (float): Duration (seconds) to render. Defaults to the duration \
+                of the mix.
+
+        Yields:
+            np.ndarray: The samples of the next block.
+        """
+        t = self.duration() if t is None else t
+        n = int(round(t * self.sample_rate))
+        B = self.block_size
+        # voice parameters as arrays (one entry per voice)
+        params = np.array(self.voices, dtype=float)
+        params = params.reshape(-1, len(Voice._fields))
+        f, a, start, stop, attack, release = params.T
+        # ramps of zero duration are steps
+        attack = np.maximum(attack, 1e-12)
+        release = np.maximum(release, 1e-12)
+        first = np.floor(start * self.sample_rate).astype(int)
+        last = np.ceil(stop * self.sample_rate).astype(int)
+        # most voices sounding during any one block
+        blocks = -(-n // B)
+        j0 = np.clip(first // B, 0, blocks)
+        j1 = np.clip(-(-last // B), 0, blocks)
+        counts = np.zeros(blocks + 1, dtype=int)
+        np.add.at(counts, j0[j0 < j1], 1)
+        np.add.at(counts, j1[j0 < j1], -1)
+        V = int(np.cumsum(counts).max(initial=0))
+        # preallocated buffers reused by every block
+        block = np.empty(B)
+        times = np.empty(B)
+        phase = np.empty((V, B))
+        gain = np.empty((V, B))
+        ramp = np.empty((V, B))
+        for n0 in range(0, n, B):
+            b = min(B, n - n0)
+            np.add(n0, np.arange(b), out=times[:b])
+            times[:b] /= self.sample_rate
+            active = np.flatnonzero((first < n0 + b) & (last > n0))
+            k = len(active)
+            if k == 0:
+                block[:b] = 0
+                yield block[:b]
+                continue
+            t_b = times[:b]
+            p, g, r = phase[:k,:b], gain[:k,:b], ramp[:k,:b]
+            # time since the start of each voice
+            np.subtract(t_b, start[active, None], out=p)
+            # attack and release ramps (both 0 outside of [start, stop])
+            np.divide(p, attack[active, None], out=g)
+            np.clip(g, 0, 1, out=g)
+            np.subtract(stop[active, None], t_b, out=r)
+            np.divide(r, release[active, None], out=r)
+            np.clip(r, 0, 1, out=r)
+            g *= r
+            g *= a[active, None]
+            # oscillators
+            p *= 2 * np.pi * f[active, None]
+            np.sin(p, out=p)
+            np.einsum('vb,vb->b', p, g, out=block[:b])
+            yield block[:b]
+
+    def render(self, t: float = None, dtype: str = 'float64') -> WAV:
+        """Render the mix into a WAV sound.
+
+        Every block is converted straight into the interleaved samples of the
+        sound, so no full-length float64 copy is made for other formats.
+
+        Args:
+            t (float): Duration (seconds) to render. Defaults to the duration \
+                of the mix.
+            dtype (str): Sample format (see :code:`WAV`). Defaults to float64.
+
+        Returns:
+            WAV: Wav file (the same samples in both channels).
+        """
+        t = self.duration() if t is None else t
+        samples = np.empty((int(round(t * self.sample_rate)), 2), dtype=dtype)
+        scratch = np.empty(self.block_size)
+        i = 0
+        for block in self.blocks(t):
+            n = len(block)
+            _convert_samples(block, samples[i:i+n, 0], scratch)
+            samples[i:i+n, 1] = samples[i:i+n, 0]
+            i += n
+        return WAV.from_samples(samples, sample_rate=self.sample_rate)
+
+
+def iter_spectrogram(blocks: Iterable[np.ndarray], window: int = 2048,
+                     hop: int = 512, batch: int = 256) -> Iterator[np.ndarray]:
+    """Compute the magnitude spectrogram of a stream of sample blocks.
+
+    Frame i of the spectrogram is the FFT of the samples [i * hop, i * hop +
+    window) weighted by a Hann window. Only full frames are computed. Up to
+    batch frames are transformed at once as strided views of the samples, so
+    memory depends on the batch and block sizes but not on the length of the
+    stream.
+
+    Args:
+        blocks (Iterable[np.ndarray]): Consecutive blocks of mono samples \
+            (such as :code:`Mixer.blocks`).
+        window (int): Number of samples in each FFT. Defaults to 2048.
+        hop (int): Number of samples between frames. Defaults to 512.
+        batch (int): Maximum number of frames per yielded array. \
+            Defaults to 256.
+
+    Yields:
+        np.ndarray: Magnitudes of shape (frames, window // 2 + 1).
+    """
+    hann = np.hanning(window)
+    buffer = np.empty(0)
+    for block in blocks:
+        buffer = np.concatenate((buffer, block))
+        n = max((len(buffer) - window) // hop + 1, 0)
+        step = buffer.strides[0]
+        for i in range(0, n, batch):
+            k = min(batch, n - i)
+            frames = np.lib.stride_tricks.as_strided(
+                buffer[i * hop:], shape=(k, window),
+                strides=(hop * step, step), writeable=False)
+            yield np.abs(np.fft.rfft(frames * hann, axis=1))
+        buffer = buffer[n * hop:]
+
+
+def _mono_blocks(sound: WAV, block_size: int) -> Iterator[np.ndarray]:
+    """Yield blocks of the sound mixed down to mono float samples."""
+    block = np.empty((block_size, sound.samples.shape[1]))
+    for i in range(0, len(sound.samples), block_size):
+        b = block[:len(sound.samples) - i]
+        _convert_samples(sound.samples[i:i+block_size], b)
+        yield b.mean(axis=1)
+
+
+def spectrogram(sound: WAV, window: int = 2048, hop: int = 512,
+                block_size: int = 2 ** 18) -> np.ndarray:
+    """Return the magnitude spectrogram of a sound (mixed down to mono).
+
+    The sound is processed in blocks (see :code:`iter_spectrogram`). To align
+    the frames of the spectrogram with the frames of an animation, use
+    hop = sample_rate / fps (see :code:`WAV.frames_view`).
+
+    Args:
+        sound (WAV): Sound to analyze.
+        window (int): Number of samples in each FFT. Defaults to 2048.
+        hop (int): Number of samples between frames. Defaults to 512.
+        block_size (int): Number of samples processed at once. \
+            Defaults to 2 ** 18.
+
+    Returns:
+        np.ndarray: Magnitudes of shape (frames, window // 2 + 1).
+    """
+    n = max((len(sound.samples) - window) // hop + 1, 0)
+    spectrum = np.empty((n, window // 2 + 1))
+    i = 0
+    for frames in iter_spectrogram(_mono_blocks(sound, block_size),
+                                   window=window, hop=hop):
+        spectrum[i:i+len(frames)] = frames
+        i += len(frames)
+    return spectrum
+
+
+def band_energy(spectrum: np.ndarray, sample_rate: int, window: int,
+                bands: List[Tuple[float, float]]) -> np.ndarray:
+    """Return the energy of every frequency band in every frame.
+
+    The energy of a band is the sum of the squared magnitudes of the FFT bins
+    with frequencies in [low, high).
+
+    Args:
+        spectrum (np.ndarray): Magnitude spectrogram (see \
+            :code:`spectrogram`).
+        sample_rate (int): Sample rate of the analyzed sound.
+        window (int): Number of samples in each FFT of the spectrogram.
+        bands (List[Tuple[float, float]]): Frequency bands (low, high).
+
+    Returns:
+        np.ndarray: Energies of shape (frames, len(bands)).
+    """
+    freqs = np.fft.rfftfreq(window, 1 / sample_rate)
+    low, high = np.array(bands, dtype=float).reshape(-1, 2).T
+    mask = (freqs[:, None] >= low) & (freqs[:, None] < high)
+    return np.square(spectrum) @ mask
@@ -1,6 +1,7 @@
 import pytest
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from dmtools.adjustments import apply_curve
+from dmtools.adjustments import apply_curve, apply_curves, _lut_cache
 
 
 # test curve
@@ -48,3 +49,104 @@ THREE_CHANNEL_WITH_ALPHA_CLIPPED_1 = np.array([[[0.0, 0.0, 1.0, 1.0],
     (THREE_CHANNEL_WITH_ALPHA, clip, 1, THREE_CHANNEL_WITH_ALPHA_CLIPPED_1)])
 def test_image_grid(image, f, c, result):
     assert np.array_equal(result, apply_curve(image, f, c))
+
+
+def gamma(x):
+    return np.power(x, 1 / 2.2)
+
+
+@pytest.mark.parametrize("lut,interpolate,atol",[
+    (256, False, 1e-12),
+    (1024, True, 1e-4),
+    (65536, False, 1e-5)])
+def test_apply_curve_lut(lut, interpolate, atol):
+    # 8-bit source
+    image = np.random.randint(0, 256, (4, 5, 4)) / 255
+    expected = apply_curve(image, gamma)
+    actual = apply_curve(image, gamma, lut=lut, interpolate=interpolate)
+    assert np.allclose(actual, expected, atol=atol, rtol=0)
+    assert np.array_equal(actual[:,:,3], image[:,:,3])
+    assert np.allclose(apply_curve(image, gamma, c=1, lut=lut,
+                                   interpolate=interpolate),
+                       apply_curve(image, gamma, c=1), atol=atol, rtol=0)
+
+    # tables are cached by curve identity
+    assert (gamma, lut) in _lut_cache
+    table = _lut_cache[(gamma, lut)]
+    apply_curve(image, gamma, lut=lut)
+    assert _lut_cache[(gamma, lut)] is table
+
+
+def test_apply_curve_lut_threads():
+    image = np.random.randint(0, 256, (4, 5, 3)) / 255
+    expected = apply_curve(image, gamma)
+    curves = [lambda x, p=p: x ** p for p in np.linspace(1, 2, 100)]
+
+    # concurrent lookups of many curves keep the cache consistent
+    def grade(i):
+        apply_curve(image, curves[i % len(curves)], lut=256)
+        return apply_curve(image, gamma, lut=256)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(grade, range(400)))
+    assert all(np.allclose(r, expected, atol=1e-12, rtol=0) for r in results)
+    assert len(_lut_cache) <= 64
+
+
+def test_apply_curve_lut_out_of_range():
+    image = np.array([[-0.5, 0.0, 1.0, 1.5]])
+    actual = apply_curve(image, clip, lut=256)
+    assert np.array_equal(actual, [[0.0, 0.0, 1.0, 1.0]])
+    with pytest.raises(ValueError):
+        apply_curve(image, clip, lut=1)
+
+
+def invert(x):
+    return 1 - x
+
+
+@pytest.mark.parametrize("lut",[None, 256])
+def test_apply_curves(lut):
+    image = np.random.randint(0, 256, (4, 5, 4)) / 255
+    original = image.copy()
+    curves = [gamma, None, invert]
+    expected = image.copy()
+    expected[:,:,0] = gamma(image[:,:,0])
+    expected[:,:,2] = invert(image[:,:,2])
+
+    result = apply_curves(image, curves, lut=lut)
+    assert np.allclose(result, expected)
+    assert np.array_equal(image, original)
+
+    out = np.zeros_like(image)
+    assert apply_curves(image, curves, out=out, lut=lut) is out
+    assert np.allclose(out, expected)
+
+    # in place
+    assert apply_curves(image, curves, out=image, lut=lut) is image
+    assert np.allclose(image, expected)
+
+    with pytest.raises(ValueError):
+        apply_curves(image, [gamma] * 5)
+    with pytest.raises(ValueError):
+        apply_curves(image, curves, out=out[:,:,:3])
+
+
+def clip_in_place(x):
+    return np.clip(x, 0, 1, out=x)
+
+
+@pytest.mark.parametrize("c",[-1, 1])
+def test_apply_curve_in_place_curve(c):
+    image = np.array([[[-0.5, 1.5, 0.5, 2.0]]])
+    original = image.copy()
+    result = apply_curve(image, clip_in_place, c=c)
+    assert np.array_equal(image, original)
+    expected = original.copy()
+    channels = slice(0, 3) if c == -1 else c
+    expected[:,:,channels] = np.clip(expected[:,:,channels], 0, 1)
+    assert np.array_equal(result, expected)
+
+    result = apply_curves(image, [clip_in_place] * 4)
+    assert np.array_equal(image, original)
+    assert np.array_equal(result, np.clip(original, 0, 1))
@@ -0,0 +1,275 @@
+import pytest
+import imageio
+import subprocess
+import imageio_ffmpeg
+from PIL import Image
+import numpy as np
+from dmtools.animation import (clip, to_mp4, read_mp4, to_gif, to_apng,
+                               render, FrameSequence, MP4Writer, _pad_to_16)
+from dmtools.io import write_png
+from dmtools.sound import wave_sequence
+
+
+def gradient_frame(i):
+    return np.full((16, 16, 3), i / 9)
+
+
+@pytest.fixture
+def frames_dir(tmp_path):
+    for i in range(10):
+        write_png(np.full((2, 3, 3), i / 9), str(tmp_path / f"f{i:04}.png"))
+    return str(tmp_path)
+
+
+def test_clip(frames_dir):
+    frames = clip(frames_dir, end=10, workers=2, cache_size=2)
+    assert isinstance(frames, FrameSequence)
+    assert len(frames) == 10
+    assert np.allclose(frames[3], np.full((2, 3, 3), 3 / 9), atol=1/255)
+    assert np.allclose(frames[-1], np.ones((2, 3, 3)))
+
+    # frames are cached on access
+    frames[3]
+    assert len(frames._cache) == 2
+    assert list(frames._cache)[-1] == frames.paths[3]
+
+    # editing a returned frame does not change the next access
+    frame = frames[3]
+    frame *= 0
+    assert np.allclose(frames[3], np.full((2, 3, 3), 3 / 9), atol=1/255)
+
+    # iteration keeps frames in order
+    values = [frame[0,0,0] for frame in frames]
+    assert np.allclose(values, np.arange(10) / 9, atol=1/255)
+
+    # slicing is lazy and composes with start, end, and step
+    sliced = clip(frames_dir, start=1, end=9, step=2)[1:]
+    assert isinstance(sliced, FrameSequence)
+    assert [p[-8:] for p in sliced.paths] == ['0003.png', '0005.png',
+                                              '0007.png']
+
+    # default end excludes the last frame
+    assert len(clip(frames_dir)) == 9
+
+
+def test_frame_sequence_map(frames_dir):
+    frames = clip(frames_dir, end=10).map(np.multiply, 0.5)
+    assert np.allclose(frames[-1], np.full((2, 3, 3), 0.5))
+    assert np.allclose(list(frames)[-1], np.full((2, 3, 3), 0.5))
+
+    # additional arguments follow the frame
+    frames = clip(frames_dir, end=10).map(np.subtract, 0.25)
+    assert np.allclose(frames[-1], np.full((2, 3, 3), 0.75))
+
+
+@pytest.mark.parametrize("shape,padded_shape",[
+    ((16, 16), (16, 16)),
+    ((10, 20, 3), (16, 32, 3)),
+    ((17, 3, 4), (32, 16, 4))])
+def test_pad_to_16(shape, padded_shape):
+    M = np.random.random(shape)
+    padded = _pad_to_16(M)
+    assert padded.shape == padded_shape
+    y_pad = padded_shape[0] - shape[0]
+    x_pad = padded_shape[1] - shape[1]
+    y0, x0 = y_pad // 2, x_pad // 2
+    assert np.array_equal(padded[y0:y0+shape[0], x0:x0+shape[1]], M)
+    assert np.sum(padded) == pytest.approx(np.sum(M))
+
+
+def test_to_mp4(tmp_path):
+    path = str(tmp_path / "animation.mp4")
+    frames = (np.full((10, 20, 3), i / 4) for i in range(5))
+    to_mp4(frames, path, fps=5, s=2)
+    reader = imageio.get_reader(path)
+    assert reader.count_frames() == 5
+    assert reader.get_meta_data()['size'] == (64, 32)
+    reader.close()
+
+    path = str(tmp_path / "writer.mp4")
+    with MP4Writer(path, fps=5) as writer:
+        writer.append(np.zeros((16, 16, 3)))
+        writer.write([np.ones((16, 16, 3))] * 2)
+    reader = imageio.get_reader(path)
+    assert reader.count_frames() == 3
+    reader.close()
+
+    # frames of odd dimensions are padded and must all match
+    path = str(tmp_path / "gray.mp4")
+    with pytest.raises(ValueError):
+        with MP4Writer(path, fps=5) as writer:
+            writer.append(np.zeros((9, 7)))
+            writer.append(np.ones((9, 7)))
+            writer.append(np.ones((7, 9)))
+    frames = list(read_mp4(path))
+    assert len(frames) == 2
+    assert frames[1].shape == (16, 16, 3)
+
+
+def test_to_mp4_audio(tmp_path):
+    scratch_dir = tmp_path / "scratch"
+    scratch_dir.mkdir()
+    path = str(tmp_path / "audio.mp4")
+    frames = [np.full((16, 16, 3), i / 9) for i in range(10)]
+    audio = wave_sequence(np.array([440, 660]), 2)
+    to_mp4(frames, path, fps=5, audio=audio, scratch_dir=str(scratch_dir))
+
+    # temporary audio file is removed
+    assert list(scratch_dir.iterdir()) == []
+    # single output file with both a video and an audio stream
+    info = subprocess.run([imageio_ffmpeg.get_ffmpeg_exe(), "-i", path],
+                          capture_output=True, text=True).stderr
+    assert "Video: h264" in info
+    assert "Audio: aac" in info
+
+    with pytest.raises(ValueError):
+        to_mp4([], str(tmp_path / "empty.mp4"), fps=5)
+
+
+@pytest.mark.parametrize("start,end,step",[
+    (0, None, 1),
+    (17, 25, 3),
+    (28, None, 1),
+    (5, 6, 4)])
+def test_read_mp4(tmp_path, start, end, step):
+    path = str(tmp_path / "read.mp4")
+    to_mp4([np.full((16, 16, 3), i / 29) for i in range(30)], path, fps=10)
+
+    frames = list(read_mp4(path, start=start, end=end, step=step))
+    expected = np.arange(30)[start:end:step] / 29
+    assert len(frames) == len(expected)
+    assert all(frame.shape == (16, 16, 3) for frame in frames)
+    assert np.allclose([f.mean() for f in frames], expected, atol=0.01)
+
+    frame = next(read_mp4(path, start=start, uint8=True))
+    assert frame.dtype == np.uint8
+    frame[0, 0] = 0
+
+
+def test_read_mp4_errors(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        read_mp4(str(tmp_path / "missing.mp4"))
+    with pytest.raises(ValueError):
+        read_mp4(str(tmp_path / "missing.mp4"), step=0)
+
+
+def moving_square_frames():
+    frames = []
+    for i in range(12):
+        frame = np.zeros((20, 30, 3))
+        frame[:,:,2] = 0.5
+        frame[5:10, i:i+5, 0] = 1
+        frames.append(frame)
+    return frames + [frames[-1]] * 3
+
+
+@pytest.mark.parametrize("write,s",[
+    (to_gif, 1),
+    (to_gif, 2),
+    (to_apng, 1),
+    (to_apng, 3)])
+def test_palette_animation(tmp_path, write, s):
+    path = str(tmp_path / "animation")
+    frames = moving_square_frames()
+    write(iter(frames), path, fps=10, s=s)
+
+    image = Image.open(path)
+    assert image.is_animated
+    assert image.size == (30 * s, 20 * s)
+    # identical frames at the end are merged into the last frame
+    assert image.n_frames == 12
+    durations = []
+    for i in range(image.n_frames):
+        image.seek(i)
+        durations.append(image.info['duration'])
+        actual = np.asarray(image.convert('RGB'))[::s, ::s] / 255
+        assert np.allclose(actual, frames[i], atol=1/255)
+    assert durations == [100] * 11 + [400]
+    image.close()
+
+
+def fade_frames(n):
+    return (np.full((4, 6, 3), i / (n - 1)) for i in range(n))
+
+
+def assert_fade(path, n):
+    image = Image.open(path)
+    assert image.n_frames == n
+    for i in range(n):
+        image.seek(i)
+        actual = np.asarray(image.convert('RGB')) / 255
+        assert np.allclose(actual, i / (n - 1), atol=1/255)
+    image.close()
+
+
+@pytest.mark.parametrize("write",[to_gif, to_apng])
+def test_palette_animation_generator(tmp_path, write):
+    # the palette of a generator is not computed from the first frame alone
+    path = str(tmp_path / "fade")
+    write(fade_frames(8), path, fps=10)
+    assert_fade(path, 8)
+
+    # representative frames for clips longer than the sampled frames
+    path = str(tmp_path / "long_fade")
+    write(fade_frames(40), path, fps=10, palette_frames=fade_frames(40))
+    assert_fade(path, 40)
+
+
+def test_palette_animation_errors(tmp_path):
+    with pytest.raises(ValueError):
+        to_gif([], str(tmp_path / "empty.gif"), fps=5)
+    with pytest.raises(ValueError):
+        to_apng([np.zeros((4, 4)), np.zeros((5, 4))],
+                str(tmp_path / "mismatch.png"), fps=5)
+
+
+@pytest.mark.parametrize("workers,processes",[
+    (1, False),
+    (3, False),
+    (2, True)])
+def test_render(tmp_path, workers, processes):
+    path = str(tmp_path / "render.mp4")
+    stats = render(gradient_frame, path, fps=5, n=10, workers=workers,
+                   queue_size=2, processes=processes)
+    assert stats.frames == 10
+    reader = imageio.get_reader(path)
+    frames = [frame for frame in reader]
+    reader.close()
+    assert len(frames) == 10
+    means = [frame.mean() / 255 for frame in frames]
+    assert np.allclose(means, np.arange(10) / 9, atol=0.02)
+
+
+def test_render_iterable(tmp_path):
+    path = str(tmp_path / "render.mp4")
+    stats = render((gradient_frame(i) for i in range(4)), path, fps=5)
+    assert stats.frames == 4
+    assert stats.encode_time <= stats.wall_time
+
+    with pytest.raises(ValueError):
+        render(gradient_frame, path, fps=5)
+
+
+def test_render_encoder_error(tmp_path):
+    path = str(tmp_path / "render.mp4")
+    frames = [np.zeros((16, 16, 3)), np.zeros((32, 32, 3))] * 20
+    with pytest.raises(Exception):
+        render(frames, path, fps=5, queue_size=1)
+
+
+def failing_frame(i):
+    if i == 6:
+        raise RuntimeError("frame failed")
+    return gradient_frame(i)
+
+
+@pytest.mark.parametrize("iterable",[False, True])
+def test_render_producer_error(tmp_path, iterable):
+    path = str(tmp_path / "render.mp4")
+    frames = failing_frame
+    if iterable:
+        frames = (failing_frame(i) for i in range(10))
+    with pytest.raises(RuntimeError):
+        render(frames, path, fps=5, n=10, workers=2, queue_size=2)
+    # no truncated animation is left behind
+    assert list(tmp_path.iterdir()) == []
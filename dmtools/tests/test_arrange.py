@@ -1,6 +1,10 @@
 import pytest
 import numpy as np
-from dmtools.arrange import image_grid, border
+import dmtools.arrange
+from dmtools.arrange import (image_grid, write_image_grid, border,
+                             contact_sheet, clear_thumbnail_cache)
+from dmtools.io import read_netpbm, write_png, write_netpbm
+from dmtools.transform import ResizeFilterName
 
 # -----------
 # TEST IMAGES
@@ -59,3 +63,93 @@ def test_image_grid(images, w, h, b, color, result):
     (OPAQUE_PIXEL, 1, None, OPAQUE_PIXEL_BLACK_BORDER)])
 def test_border(image, b, color, result):
     assert np.array_equal(result, border(image, b, color))
+
+
+def test_image_grid_large():
+    images = [np.full((3, 4, 3), i / 2500) for i in range(2500)]
+    grid = image_grid(images, 50, 50, 2, np.array([0.5, 0.5, 0.5]))
+    assert grid.shape == (50*3 + 51*2, 50*4 + 51*2, 3)
+    for i, j in [(0, 0), (17, 31), (49, 49)]:
+        y, x = 2 + i*5, 2 + j*6
+        assert np.array_equal(grid[y:y+3, x:x+4], images[i*50 + j])
+    # the borders are the border color
+    assert np.all(grid[:2] == 0.5)
+    assert np.all(grid[:, 6:8] == 0.5)
+    assert np.sum(grid == 0.5) >= grid.size - 2500*36
+
+
+def test_image_grid_lazy(tmp_path):
+    images = (np.full((2, 3), i / 5) for i in range(6))
+    shape = (2*2 + 3*1, 3*3 + 4*1)
+    out = np.memmap(str(tmp_path / "grid.dat"), dtype=float, mode='w+',
+                    shape=shape)
+    grid = image_grid(images, 3, 2, 1, np.array([0]), out=out)
+    assert grid is out
+    expected = image_grid([np.full((2, 3), i / 5) for i in range(6)],
+                          3, 2, 1, np.array([0]))
+    assert np.array_equal(np.asarray(out), expected)
+
+    with pytest.raises(ValueError):
+        image_grid(iter([WHITE_PIXEL] * 3), 2, 2, 1)
+    with pytest.raises(ValueError):
+        image_grid([WHITE_PIXEL] * 4, 2, 2, 1, out=np.zeros((2, 2)))
+
+
+@pytest.mark.parametrize("shape,color",[
+    ((4, 5), None),
+    ((4, 5), np.array([0])),
+    ((3, 2, 3), np.array([0.2, 0.4, 0.6]))])
+def test_write_image_grid(tmp_path, shape, color):
+    images = [np.random.random(shape) for _ in range(6)]
+    path = str(tmp_path / "grid.pnm")
+    write_image_grid(iter(images), 2, 3, 2, path, color=color)
+    expected = image_grid(images, 2, 3, 2, color)
+    assert np.allclose(read_netpbm(path), expected, atol=0.5/255)
+
+    with pytest.raises(ValueError):
+        write_image_grid([np.zeros((2, 2, 4))], 1, 1, 1, path)
+
+
+@pytest.mark.parametrize("processes",[False, True])
+def test_contact_sheet(tmp_path, monkeypatch, processes):
+    wide = str(tmp_path / "wide.png")
+    tall = str(tmp_path / "tall.pgm")
+    write_png(np.full((4, 8, 3), 0.5), wide)
+    write_netpbm(np.zeros((8, 2)), 255, tall)
+    paths = [wide, tall, wide]
+
+    sheet = contact_sheet(paths, 4, 4, w=2, b=1, color=np.array([1, 0, 0]),
+                          filter=ResizeFilterName.BOX, workers=2,
+                          processes=processes)
+    assert sheet.shape == (2*4 + 3*1, 2*4 + 3*1, 3)
+    red = np.array([1, 0, 0])
+    # wide image is fit to 4 x 2 and centered vertically
+    cell = sheet[1:5, 1:5]
+    assert np.all(cell[0] == red) and np.all(cell[3] == red)
+    assert np.allclose(cell[1:3], 0.5, atol=1/255)
+    # tall image is fit to 1 x 4 and centered horizontally
+    cell = sheet[1:5, 6:10]
+    assert np.all(cell[:, :1] == red) and np.all(cell[:, 2:] == red)
+    assert np.all(cell[:, 1] == 0)
+    # repeated image and blank cell
+    assert np.array_equal(sheet[6:10, 1:5], sheet[1:5, 1:5])
+    assert np.all(sheet[6:10, 6:10] == red)
+
+    # thumbnails are cached
+    def fail(path):
+        raise AssertionError("thumbnail was not cached")
+
+    monkeypatch.setattr(dmtools.arrange, "read", fail)
+    again = contact_sheet(paths, 4, 4, w=2, b=1, color=np.array([1, 0, 0]),
+                          filter=ResizeFilterName.BOX, processes=False)
+    assert np.array_equal(again, sheet)
+
+    # the cache holds 8-bit thumbnails up to cache_size bytes
+    cache = dmtools.arrange._thumbnail_cache
+    assert all(t.dtype == np.uint8 for t in cache.values())
+    monkeypatch.undo()
+    clear_thumbnail_cache()
+    contact_sheet(paths, 4, 4, w=2, processes=False, cache_size=4*4*3)
+    assert len(cache) == 1
+    contact_sheet(paths, 4, 4, w=2, processes=False, cache_size=0)
+    assert len(cache) == 0
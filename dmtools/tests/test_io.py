@@ -2,10 +2,12 @@ import os
 import sys
 import shutil
 import pytest
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from imageio import imread
-from dmtools.io import (Metadata, read, write_netpbm, write_png, write_ascii,
-                        recreate_script_from_png, _get_next_version)
+from dmtools.io import (Metadata, read, read_many, write_netpbm, write_png,
+                        write_ascii, recreate_script_from_png,
+                        _get_next_version, _claim_next_version)
 
 RESOURCES_PATH = os.path.join(os.path.dirname(__file__), 'resources/io_tests')
 
@@ -41,6 +43,46 @@ def test_get_next_version():
     shutil.rmtree(dir_name)
 
 
+def test_claim_next_version():
+    dir_name = "dir_for_claim_testing"
+    os.makedirs(dir_name, exist_ok=True)
+    path = f"{dir_name}/frame.png"
+
+    # claimed names are created on disk and never handed out twice
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        names = list(executor.map(lambda _: _claim_next_version(path),
+                                  range(50)))
+    expected = [f"{dir_name}/frame_{i:04}.png" for i in range(1,51)]
+    assert sorted(names) == expected
+    assert all(os.path.exists(name) for name in names)
+
+    # files created by someone else are not reused
+    open(f"{dir_name}/frame_0051.ppm", "w").close()
+    assert f"{dir_name}/frame_0052.png" == _claim_next_version(path)
+
+    # versioning restarts if the versioned files are removed
+    shutil.rmtree(dir_name)
+    os.makedirs(dir_name)
+    assert f"{dir_name}/frame_0001.png" == _claim_next_version(path)
+    shutil.rmtree(dir_name)
+
+
+def test_failed_versioned_write(tmp_path):
+    path = str(tmp_path / "x.png")
+
+    # the claimed name is released if the image cannot be written
+    with pytest.raises(Exception):
+        write_png(np.zeros((2,2,7)), path, versioning=True)
+    assert os.listdir(tmp_path) == []
+    with pytest.raises(Exception):
+        write_netpbm(np.zeros((2,2,3)), 255, str(tmp_path / "x.ppm"),
+                     versioning=True, metadata=object())
+    assert os.listdir(tmp_path) == []
+
+    write_png(np.zeros((2,2,3)), path, versioning=True)
+    assert os.listdir(tmp_path) == ["x_0001.png"]
+
+
 @pytest.mark.parametrize("name",[
     ('color_matrix.png')])
 def test_png_io(name):
@@ -56,6 +98,19 @@ def test_png_io(name):
     assert np.array_equal(src, image)
 
 
+def test_png_io_premultiplied():
+    src = read(os.path.join(RESOURCES_PATH, 'color_matrix.png'))
+    image = np.append(src, np.full(src.shape[:2] + (1,), 0.5), axis=2)
+    premultiplied = image.copy()
+    premultiplied[:,:,:3] *= 0.5
+
+    write_png(premultiplied, 'premultiplied.png', premultiplied=True)
+    actual = read('premultiplied.png')
+    os.remove('premultiplied.png')
+
+    assert np.allclose(actual, image, atol=1/255)
+
+
 @pytest.mark.parametrize("name,k,new_ext",[
     ('color_matrix_ascii.pbm', 1, 'pbm'),
     ('color_matrix_ascii.pbm', 255, 'pgm'),
@@ -77,6 +132,29 @@ def test_netpbm_io(name, k, new_ext):
     assert np.array_equal(src, image)
 
 
+@pytest.mark.parametrize("workers,processes",[
+    (1, False),
+    (4, False),
+    (2, True)])
+def test_read_many(workers, processes):
+    names = ['color_matrix_raw.ppm', 'color_matrix.png',
+             'color_matrix_ascii.ppm'] * 3
+    paths = [os.path.join(RESOURCES_PATH, name) for name in names]
+    expected = [read(path) for path in paths]
+
+    images = read_many(paths, workers=workers, prefetch=2,
+                       processes=processes)
+    assert len(images) == len(expected)
+    assert all(np.array_equal(a, b) for a, b in zip(images, expected))
+
+    out = np.zeros((len(paths),) + expected[0].shape)
+    assert read_many(paths, workers=workers, out=out) is out
+    assert np.array_equal(out, np.array(expected))
+
+    with pytest.raises(ValueError):
+        read_many(paths, workers=workers, out=out[:1])
+
+
 @pytest.mark.parametrize("src,txt_expected_path,png_expected_path",[
     ('12_gradient.pgm', '12_gradient.txt', '12_gradient.png')])
 def test_ascii_io(src, txt_expected_path, png_expected_path):
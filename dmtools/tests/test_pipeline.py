@@ -0,0 +1,64 @@
+import os
+import pytest
+import numpy as np
+from dmtools.pipeline import Pipeline
+from dmtools.transform import rescale, clip, normalize
+from dmtools.colorspace import RGB_to_Lab, Lab_to_RGB, RGB_to_gray
+from dmtools.adjustments import apply_curve
+from dmtools.io import read
+
+RESOURCES_PATH = os.path.join(os.path.dirname(__file__), 'resources')
+
+
+def curve(x):
+    return np.power(x, 0.8)
+
+
+def chain(image):
+    image = rescale(image, k=2)
+    image = RGB_to_Lab(image)
+    image = apply_curve(image, curve, c=0)
+    image = Lab_to_RGB(image)
+    return clip(image)
+
+
+@pytest.mark.parametrize("tile_size",[1, 7, 16384])
+def test_pipeline(tile_size):
+    image = np.random.random((9, 11, 3))
+    pipeline = (Pipeline(image, tile_size=tile_size)
+                .map(rescale, k=2)
+                .map(RGB_to_Lab)
+                .map(apply_curve, curve, c=0)
+                .map(Lab_to_RGB)
+                .map(clip))
+    assert np.allclose(pipeline.run(), chain(image))
+
+    # elementwise operations are fused into a single stage
+    stages = pipeline._stages()
+    assert [(elementwise, len(ops)) for elementwise, ops in stages] == \
+        [(False, 1), (True, 4)]
+
+    out = np.zeros((18, 22, 3))
+    assert pipeline.run(out=out) is out
+    assert np.allclose(out, chain(image))
+
+
+def test_pipeline_pointwise(tmp_path):
+    path = os.path.join(RESOURCES_PATH, 'io_tests', 'color_matrix.png')
+    image = read(path)
+    pipeline = (Pipeline(path, tile_size=4)
+                .pointwise(np.multiply, 2)
+                .map(RGB_to_gray)
+                .map(normalize)
+                .pointwise(np.subtract, 1))
+    assert [elementwise for elementwise, _ in pipeline._stages()] == \
+        [True, False, True]
+    expected = normalize(RGB_to_gray(image * 2)) - 1
+    assert np.allclose(pipeline.run(), expected)
+
+    png_path = str(tmp_path / "pipeline.png")
+    Pipeline(path).map(clip).write_png(png_path)
+    assert np.array_equal(read(png_path), image)
+
+    with pytest.raises(ValueError):
+        Pipeline(image, tile_size=4).pointwise(np.transpose, (1, 0, 2)).run()
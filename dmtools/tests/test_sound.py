@@ -0,0 +1,311 @@
+import pytest
+import tracemalloc
+import numpy as np
+from scipy.io import wavfile
+from dmtools.sound import (WAV, WAVWriter, Mixer, wave_sequence, read_wav,
+                           spectrogram, iter_spectrogram, band_energy,
+                           SAMPLE_RATE)
+
+
+@pytest.mark.parametrize("frequencies,t,n",[
+    (np.array([440]), 1, SAMPLE_RATE),
+    (np.array([440, 880, 220]), 0.5, SAMPLE_RATE // 2),
+    (np.array([440, 880]), np.array([0.25, 0.5]), 3 * SAMPLE_RATE // 4),
+    (np.linspace(100, 1000, 20000), 10, 10 * SAMPLE_RATE)])
+def test_wave_sequence(frequencies, t, n):
+    sound = wave_sequence(frequencies, t)
+    assert len(sound.r) == n
+    assert np.array_equal(sound.r, sound.l)
+    assert sound.r[0] == 0
+    # phase is continuous, so consecutive samples never jump more than the
+    # highest frequency allows
+    max_step = 2 * np.pi * np.max(frequencies) / SAMPLE_RATE
+    assert np.max(np.abs(np.diff(sound.r))) <= max_step + 1e-9
+
+
+def test_wave_sequence_frequency():
+    sound = wave_sequence(np.array([441, 882]), 2)
+    for i, f in enumerate([441, 882]):
+        segment = sound.r[i * SAMPLE_RATE:(i + 1) * SAMPLE_RATE]
+        spectrum = np.abs(np.fft.rfft(segment))
+        assert np.argmax(spectrum) == f
+
+
+def test_wave_sequence_errors():
+    with pytest.raises(ValueError):
+        wave_sequence(np.array([440, 880]), np.array([1, 2, 3]))
+
+
+@pytest.mark.parametrize("block_size",[7, 1000, 4096, 100000])
+def test_mixer(block_size):
+    mixer = Mixer(block_size=block_size)
+    mixer.add(440, 0.5, 0, 0.25)
+    mixer.add(660, 0.25, 0.1, 0.3, attack=0.05, release=0.1)
+    mixer.add(880, 0.1, 0.4, 0.5)
+    sound = mixer.render()
+
+    t = np.arange(int(0.5 * SAMPLE_RATE)) / SAMPLE_RATE
+    expected = 0.5 * np.sin(2 * np.pi * 440 * t) * (t < 0.25)
+    envelope = np.clip((t - 0.1) / 0.05, 0, 1) * np.clip((0.3 - t) / 0.1, 0, 1)
+    expected += 0.25 * np.sin(2 * np.pi * 660 * (t - 0.1)) * envelope
+    expected += 0.1 * np.sin(2 * np.pi * 880 * (t - 0.4)) * (t >= 0.4)
+    assert len(sound.r) == len(expected)
+    assert np.allclose(sound.r, expected)
+    assert np.array_equal(sound.r, sound.l)
+
+    # silence between voices and a longer render are zero
+    assert np.all(mixer.render(0.6).r[len(expected):] == 0)
+    assert np.all(sound.r[int(0.3 * SAMPLE_RATE):int(0.4 * SAMPLE_RATE)] == 0)
+
+
+def test_mixer_sequential_voices():
+    # buffers are sized by the voices sounding at once, not all voices
+    mixer = Mixer(block_size=4096)
+    for i in range(5000):
+        mixer.add(440, 0.5, i * 0.01, (i + 1) * 0.01)
+    tracemalloc.start()
+    sound = mixer.render(0.05)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert peak < 5 * 10**6
+    t = np.arange(len(sound.r)) / SAMPLE_RATE
+    starts = np.floor(t / 0.01) * 0.01
+    expected = 0.5 * np.sin(2 * np.pi * 440 * (t - starts))
+    assert np.allclose(sound.r, expected, atol=1e-6)
+
+
+def test_mixer_errors():
+    with pytest.raises(ValueError):
+        Mixer().add(440, 1, 1, 0)
+    assert len(Mixer().render().r) == 0
+
+
+@pytest.mark.parametrize("dtype,scale",[
+    ('int16', 32767),
+    ('int32', 2147483647),
+    ('float32', 1),
+    ('float64', 1)])
+def test_wav_writer(tmp_path, dtype, scale):
+    path = str(tmp_path / "test.wav")
+    r = np.sin(np.linspace(0, 100, 10000))
+    l = np.cos(np.linspace(0, 100, 10000))
+    with WAVWriter(path, sample_rate=8000, dtype=dtype,
+                   chunk_size=999) as writer:
+        writer.write(r[:1234], l[:1234])
+        writer.write(r[1234:], l[1234:])
+
+    sample_rate, data = wavfile.read(path)
+    assert sample_rate == 8000
+    assert data.dtype == np.dtype(dtype)
+    assert data.shape == (10000, 2)
+    assert np.allclose(data[:,0] / scale, r, atol=1e-4)
+    assert np.allclose(data[:,1] / scale, l, atol=1e-4)
+
+    sound = read_wav(path, mmap=True)
+    assert sound.sample_rate == 8000
+    assert isinstance(sound.r.base, np.memmap)
+    assert np.array_equal(sound.r, data[:,0])
+    assert np.array_equal(sound.l, data[:,1])
+    del sound
+
+
+def test_to_wav(tmp_path):
+    path = str(tmp_path / "test.wav")
+    sound = wave_sequence(np.array([440, 880]), 0.1)
+    sound.to_wav(path)
+    # default format matches scipy's float64 output
+    expected_path = str(tmp_path / "expected.wav")
+    wavfile.write(expected_path, SAMPLE_RATE, np.array([sound.r, sound.l]).T)
+    with open(path, 'rb') as f, open(expected_path, 'rb') as g:
+        assert f.read() == g.read()
+
+    read = read_wav(path)
+    assert np.array_equal(read.r, sound.r)
+    assert np.array_equal(read.l, sound.l)
+
+
+def test_wav_writer_errors(tmp_path):
+    path = str(tmp_path / "test.wav")
+    with pytest.raises(ValueError):
+        WAVWriter(path, dtype='uint16')
+    with WAVWriter(path, channels=1) as writer:
+        with pytest.raises(ValueError):
+            writer.write(np.zeros(3), np.zeros(3))
+    with pytest.raises(ValueError):
+        WAV(np.zeros(3), np.zeros(4)).to_wav(path)
+
+    # sizes past the 32 bit limit of the header are rejected before writing
+    with WAVWriter(path, dtype='int16') as writer:
+        writer.write(np.zeros(3), np.zeros(3))
+        writer._frames = 2**30 - 20
+        with pytest.raises(ValueError):
+            writer.write(np.zeros(8), np.zeros(8))
+        with pytest.raises(ValueError):
+            writer.write_samples(np.zeros((8, 2), dtype=np.int16))
+        writer._frames = 3
+    assert wavfile.read(path)[1].shape == (3, 2)
+
+
+@pytest.mark.parametrize("dtype,scale",[
+    (None, 1),
+    ('float32', 1),
+    ('int16', 32767)])
+def test_wav_storage(tmp_path, dtype, scale):
+    r = np.linspace(-1, 1, 101)
+    l = -r
+    sound = WAV(r, l, dtype=dtype)
+    assert sound.samples.shape == (101, 2)
+    assert sound.samples.flags['C_CONTIGUOUS']
+    assert sound.dtype == np.dtype(dtype or 'float64')
+    # channels are views of the interleaved samples
+    assert sound.r.base is sound.samples
+    assert np.allclose(sound.r / scale, r, atol=1e-4)
+    assert np.allclose(sound.l / scale, l, atol=1e-4)
+
+    path = str(tmp_path / "test.wav")
+    sound.to_wav(path)
+    _, data = wavfile.read(path)
+    assert np.array_equal(data, sound.samples)
+
+    # converting to float scales integer samples back into [-1,1]
+    converted = WAV(sound.r, sound.l, dtype='float32')
+    assert np.allclose(converted.r, r, atol=1e-4)
+
+    sound.l = r
+    assert np.array_equal(sound.l, sound.r)
+    assert sound.dtype == np.dtype(dtype or 'float64')
+
+
+def test_wav_integer_samples():
+    # integer samples of other types are kept as int32 PCM values
+    sound = WAV(np.array([0, 1000, -1000]), np.array([1, 2, 3]))
+    assert sound.dtype == np.int32
+    assert np.array_equal(sound.r, [0, 1000, -1000])
+    assert np.array_equal(sound.l, [1, 2, 3])
+
+    sound = WAV(np.array([0, 1000], dtype=np.int64),
+                np.array([0, 1000], dtype=np.int16), dtype='int16')
+    assert np.array_equal(sound.r, sound.l)
+
+    # channels of different integer types share one format without scaling
+    sound = WAV(np.array([1000], np.int16), np.array([1000]))
+    assert sound.dtype == np.int16
+    assert np.array_equal(sound.r, sound.l)
+    sound = WAV(np.array([100], np.int32), np.array([100], np.int8))
+    assert sound.dtype == np.int32
+    assert np.array_equal(sound.r, sound.l)
+
+    with pytest.raises(ValueError):
+        WAV(np.array([2**40, 0]), np.array([0, 0]))
+    with pytest.raises(ValueError):
+        WAV(np.array([40000]), np.array([0]), dtype='int16')
+    with pytest.raises(ValueError):
+        WAV(np.array([1000]), np.array([0]), dtype='float32')
+
+
+def test_wav_uint8_file(tmp_path):
+    path = str(tmp_path / "8bit.wav")
+    data = np.array([[0, 255], [128, 64], [200, 128]], dtype=np.uint8)
+    wavfile.write(path, 8000, data)
+
+    sound = read_wav(path)
+    assert sound.dtype == np.int16
+    assert np.array_equal(sound.samples, (data.astype(int) - 128) * 256)
+
+    copy_path = str(tmp_path / "copy.wav")
+    sound.to_wav(copy_path)
+    sample_rate, copied = wavfile.read(copy_path)
+    assert sample_rate == 8000
+    assert np.array_equal(copied, sound.samples)
+
+    with pytest.raises(ValueError):
+        WAV.from_samples(np.zeros((4, 2), dtype=np.int64))
+
+
+def test_wav_formats():
+    sound = wave_sequence(np.array([440]), 0.1, dtype='int16')
+    assert sound.dtype == np.int16
+    assert np.max(np.abs(sound.r)) > 32000
+
+    mixer = Mixer()
+    mixer.add(440, 0.5, 0, 0.1)
+    expected = mixer.render()
+    rendered = mixer.render(dtype='float32')
+    assert rendered.dtype == np.float32
+    assert np.allclose(rendered.r, expected.r, atol=1e-6)
+    assert np.array_equal(rendered.r, rendered.l)
+
+
+@pytest.mark.parametrize("dtype",[None, 'int16'])
+def test_resample(dtype):
+    sound = wave_sequence(np.array([441]), 1, dtype=dtype)
+    resampled = sound.resample(48000)
+    assert resampled.sample_rate == 48000
+    assert resampled.dtype == sound.dtype
+    assert len(resampled.r) == 48000
+    spectrum = np.abs(np.fft.rfft(resampled.r.astype(float)))
+    assert np.argmax(spectrum) == 441
+
+    same = sound.resample(SAMPLE_RATE)
+    assert np.array_equal(same.samples, sound.samples)
+
+
+def test_frames_view():
+    sound = WAV(np.arange(100) / 100, -np.arange(100) / 100, sample_rate=100)
+    frames = sound.frames_view(fps=4)
+    assert frames.shape == (4, 25, 2)
+    assert np.shares_memory(frames, sound.samples)
+    assert not frames.flags['WRITEABLE']
+    assert np.array_equal(frames[2,:,0], np.arange(50, 75) / 100)
+    assert np.array_equal(frames[2,:,1], -np.arange(50, 75) / 100)
+
+    overlapping = sound.frames_view(fps=10, size=30)
+    assert overlapping.shape == (8, 30, 2)
+    assert np.array_equal(overlapping[7,:,0], np.arange(70, 100) / 100)
+
+    # windows start at the nearest sample if the hop is not an integer
+    frames = sound.frames_view(fps=3)
+    assert len(frames) == 3
+    assert all(frame.shape == (33, 2) for frame in frames)
+    assert all(np.shares_memory(frame, sound.samples) for frame in frames)
+    assert not frames[0].flags['WRITEABLE']
+    assert np.array_equal(frames[1][:,0], np.arange(33, 66) / 100)
+    assert np.array_equal(frames[2][:,0], np.arange(67, 100) / 100)
+
+    sound = WAV(np.zeros(44100), np.zeros(44100), sample_rate=44100)
+    frames = sound.frames_view(fps=24)
+    assert len(frames) == 24
+    assert all(frame.shape == (1838, 2) for frame in frames)
+
+
+@pytest.mark.parametrize("window,hop,block_size",[
+    (256, 64, 1000),
+    (512, 512, 100),
+    (1024, 441, 2 ** 18)])
+def test_spectrogram(window, hop, block_size):
+    sound = wave_sequence(np.array([1000, 5000]), 0.5, dtype='int16')
+    spectrum = spectrogram(sound, window=window, hop=hop,
+                           block_size=block_size)
+    n = (len(sound.r) - window) // hop + 1
+    assert spectrum.shape == (n, window // 2 + 1)
+
+    # matches a direct FFT of every frame
+    x = sound.r / 32767
+    for i in [0, n // 2, n - 1]:
+        frame = x[i * hop:i * hop + window] * np.hanning(window)
+        assert np.allclose(spectrum[i], np.abs(np.fft.rfft(frame)))
+
+    energy = band_energy(spectrum, SAMPLE_RATE, window,
+                         [(500, 2000), (4000, 6000)])
+    assert energy.shape == (n, 2)
+    assert energy[0, 0] > 100 * energy[0, 1]
+    assert energy[-1, 1] > 100 * energy[-1, 0]
+
+
+def test_iter_spectrogram():
+    x = np.random.random(10000)
+    expected = np.vstack(list(iter_spectrogram([x], window=128, hop=32)))
+    blocks = np.array_split(x, 37)
+    streamed = list(iter_spectrogram(blocks, window=128, hop=32, batch=5))
+    assert all(len(frames) <= 5 for frames in streamed)
+    assert np.allclose(np.vstack(streamed), expected)
@@ -1,9 +1,12 @@
 import os
 import pytest
+import tracemalloc
+from functools import partial
 import numpy as np
-from dmtools.transform import (rescale, blur, composite, clip, normalize,
-                               wraparound, _over_alpha_composite,
-                               _over_color_composite, crop, substitute,
+from dmtools.transform import (rescale, blur, composite, composite_stack,
+                               clip, normalize, wraparound, crop, substitute,
+                               premultiply, unpremultiply,
+                               _over_alpha_composite, _over_color_composite,
                                ResizeFilterName, CompositeOpName, CompositeOp,
                                Loc)
 from dmtools.colorspace import gray_to_RGB
@@ -130,6 +133,206 @@ def test_composite_functions():
     assert np.allclose(result, image, atol=0.01)
 
 
+def random_layer(shape):
+    layer = np.random.random(shape + (4,))
+    layer[0, 0, 3] = 0
+    return layer
+
+
+@pytest.mark.parametrize("operators",[
+    CompositeOpName.OVER,
+    [CompositeOpName.ADD, CompositeOpName.DEST_OVER],
+    [CompositeOpName.OVER,
+     CompositeOp(_over_alpha_composite, _over_color_composite)]])
+def test_composite_stack(operators):
+    layers = [random_layer((6, 8)) for _ in range(3)]
+    expected = layers[0]
+    ops = operators if isinstance(operators, list) else [operators] * 2
+    for layer, op in zip(layers[1:], ops):
+        expected = composite(layer, expected, op)
+    assert np.allclose(composite_stack(layers, operators), expected)
+
+    # layers are not modified
+    assert layers[0][0, 0, 3] == 0
+
+
+@pytest.mark.parametrize("operator", list(CompositeOpName) + [
+    CompositeOp(_over_alpha_composite, _over_color_composite)])
+def test_composite_premultiplied(operator):
+    A = random_layer((6, 8))
+    B = random_layer((6, 8))
+    pA, pB = premultiply(A), premultiply(B)
+    result = composite(pA, pB, operator, premultiplied=True)
+    assert np.allclose(unpremultiply(result), composite(A, B, operator))
+    # inputs are not modified
+    assert np.array_equal(pB, premultiply(B))
+
+    image = composite_stack([pB, pA, pA], operator, premultiplied=True)
+    expected = composite(pA, result, operator, premultiplied=True)
+    assert np.allclose(image, expected)
+
+
+@pytest.mark.parametrize("premultiplied",[False, True])
+def test_composite_placement(premultiplied):
+    dest = random_layer((6, 8))
+    dest[0, 0, :3] = 0
+    source = random_layer((3, 4))
+    if premultiplied:
+        dest, source = premultiply(dest), premultiply(source)
+    expected = dest.copy()
+    expected[3:6, 6:8] = composite(source[:3, :2], expected[3:6, 6:8],
+                                   premultiplied=premultiplied)
+
+    # only the overlap is composited and dest is modified in place
+    image = composite(source, dest, x=6, y=3, premultiplied=premultiplied)
+    assert image is dest
+    assert np.allclose(image, expected)
+
+    expected[1:4, 2:6] = composite(source, expected[1:4, 2:6],
+                                   CompositeOpName.ADD,
+                                   premultiplied=premultiplied)
+    composite(source, dest, CompositeOpName.ADD, x=0.5, y=0.5,
+              relative=True, loc=Loc.CENTER, premultiplied=premultiplied)
+    assert np.allclose(dest, expected)
+
+    # sources outside of dest leave it untouched
+    composite(source, dest, x=-4, y=0, premultiplied=premultiplied)
+    assert np.allclose(dest, expected)
+
+    # a point needs both coordinates
+    with pytest.raises(ValueError):
+        composite(source, dest, x=1, premultiplied=premultiplied)
+    with pytest.raises(ValueError):
+        composite(source, dest, y=1, premultiplied=premultiplied)
+    assert np.allclose(dest, expected)
+
+
+@pytest.mark.parametrize("operator,x,a",[
+    (CompositeOpName.MULTIPLY, 0.2 * 0.6, 1),
+    (CompositeOpName.SCREEN, 0.2 + 0.6 - 0.2 * 0.6, 1),
+    (CompositeOpName.IN, 0.2, 0.5 * 0.25),
+    (CompositeOpName.OUT, 0.2, 0.5 * 0.75),
+    (CompositeOpName.ATOP, (0.2 * 0.5 + 0.6 * 0.5) * 0.25 / 0.25, 0.25),
+    (CompositeOpName.XOR, (0.1 * 0.75 + 0.15 * 0.5) / 0.5, 0.5),
+    (CompositeOpName.SATURATE, (0.2 * 0.5 + 0.15) / 0.75, 0.75)])
+def test_composite_cairo_operators(operator, x, a):
+    source = np.full((2, 3, 4), 0.2)
+    dest = np.full((2, 3, 4), 0.6)
+    if operator not in (CompositeOpName.MULTIPLY, CompositeOpName.SCREEN):
+        source[:,:,3] = 0.5
+        dest[:,:,3] = 0.25
+    else:
+        source[:,:,3] = dest[:,:,3] = 1
+    image = composite(source, dest, operator)
+    assert np.allclose(image[:,:,:3], x)
+    assert np.allclose(image[:,:,3], a)
+
+
+@pytest.mark.parametrize("operator",[
+    CompositeOpName.IN,
+    CompositeOpName.OUT])
+def test_composite_unbounded(operator):
+    dest = random_layer((6, 8))
+    source = random_layer((3, 4))
+    expected = np.zeros_like(dest)
+    expected[1:4, 2:6] = composite(source, dest[1:4, 2:6], operator)
+
+    # dest outside of the source is cleared
+    image = composite_stack([dest, source], operator, offsets=[(2, 1)])
+    assert np.allclose(image, expected)
+    composite(source, dest, operator, x=2, y=1)
+    assert np.allclose(dest, expected)
+
+
+def allocated(f, *args):
+    tracemalloc.start()
+    f(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+@pytest.mark.parametrize("operator", list(CompositeOpName))
+def test_composite_allocations(operator):
+    A = premultiply(random_layer((400, 400)))
+    B = premultiply(random_layer((400, 400)))
+    xaB, aB = B[:,:,:3], B[:,:,3:]
+    scratch = np.empty_like(B)
+    kernel = operator.value.premultiplied
+
+    # the in-place kernels only use NumPy's fixed size iteration buffers
+    # while the OVER path of composite allocates several frames
+    frame = A.nbytes
+    peak = allocated(kernel, A[:,:,:3], A[:,:,3:], xaB, aB, scratch)
+    assert peak < frame / 16
+    assert allocated(composite, A, B) > 3 * frame
+
+    # so does composite given out and scratch, full frame or placed
+    expected = composite(A, B, operator, premultiplied=True)
+    out = np.empty_like(B)
+    peak = allocated(partial(composite, A, B, operator, premultiplied=True,
+                             out=out, scratch=scratch))
+    assert peak < frame / 16
+    assert np.allclose(out, expected)
+    peak = allocated(partial(composite, A[:200, :200], out, operator,
+                             premultiplied=True, x=100, y=100, out=out,
+                             scratch=scratch))
+    assert peak < frame / 16
+
+
+def test_composite_out():
+    A = random_layer((6, 8))
+    B = random_layer((6, 8))
+    expected = composite(A, B, CompositeOpName.XOR)
+    out = np.zeros_like(B)
+    assert composite(A, B, CompositeOpName.XOR, out=out) is out
+    assert np.allclose(out, expected)
+    # dest is not modified unless it is out
+    assert not np.allclose(B, expected)
+    assert composite(A, B, CompositeOpName.XOR, out=B) is B
+    assert np.allclose(B, expected)
+    with pytest.raises(ValueError):
+        composite(A, B, out=out[:3])
+
+
+def test_premultiply():
+    image = random_layer((6, 8))
+    image[0, 0, :3] = 0
+    assert np.allclose(premultiply(image)[:,:,:3],
+                       image[:,:,:3] * image[:,:,3:])
+    assert np.allclose(unpremultiply(premultiply(image)), image)
+
+
+def test_composite_stack_offsets():
+    bottom = random_layer((6, 8))
+    bottom[0, 0, :3] = 0
+    top = random_layer((3, 4))
+    image = composite_stack([bottom, top, top], offsets=[(2, 1), (6, 4)])
+
+    expected = bottom.copy()
+    region = composite(top, expected[1:4, 2:6])
+    expected[1:4, 2:6] = region
+    # layers extending past the bottom layer are clipped
+    region = composite(top[:2, :2], expected[4:6, 6:8])
+    expected[4:6, 6:8] = region
+    assert np.allclose(image, expected)
+
+    # layers outside of the bottom layer are skipped
+    image = composite_stack([bottom, top], offsets=[(0.5, 2)], relative=True)
+    assert np.allclose(image, bottom)
+
+    image = composite_stack([bottom, top], offsets=[(0.5, 0.5)],
+                            relative=True, loc=Loc.CENTER)
+    expected = bottom.copy()
+    expected[1:4, 2:6] = composite(top, expected[1:4, 2:6])
+    assert np.allclose(image, expected)
+
+    with pytest.raises(ValueError):
+        composite_stack([bottom, top], offsets=[])
+    with pytest.raises(ValueError):
+        composite_stack([bottom, top[:,:,:3]])
+
+
 @pytest.mark.parametrize("path,sub_path,x,y,relative,loc,exp_path",[
     ('red_box', 'blue_box', 100, 100, False, Loc.UPPER_LEFT, 'red_blue_box'),
     ('red_box', 'blue_box', 100, 200, False, Loc.LOWER_LEFT, 'red_blue_box'),
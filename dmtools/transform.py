@@ -3,7 +3,7 @@ from math import floor, ceil, sqrt
 from functools import partial
 from enum import Enum
 from collections import namedtuple
-from typing import Union, List
+from typing import Union, List, Tuple
 
 
 class Loc(Enum):
@@ -113,7 +113,161 @@ def _add_color_composite(xA, aA, xB, aB, xaA, xaB, aR) -> np.ndarray:
     return _safe_divide(xaA + xaB, aR)
 
 
-CompositeOp = namedtuple('CompositeOp', 'alpha color')
+def _multiply_alpha_composite(aA, aB) -> np.ndarray:
+    return aA + aB * (1 - aA)
+
+
+def _multiply_color_composite(xA, aA, xB, aB, xaA, xaB, aR) -> np.ndarray:
+    return _safe_divide(xaA * (1 - aB) + xaB * (1 - aA) + xaA * xaB, aR)
+
+
+def _screen_alpha_composite(aA, aB) -> np.ndarray:
+    return aA + aB * (1 - aA)
+
+
+def _screen_color_composite(xA, aA, xB, aB, xaA, xaB, aR) -> np.ndarray:
+    return _safe_divide(xaA + xaB - xaA * xaB, aR)
+
+
+def _in_alpha_composite(aA, aB) -> np.ndarray:
+    return aA * aB
+
+
+def _in_color_composite(xA, aA, xB, aB, xaA, xaB, aR) -> np.ndarray:
+    return _safe_divide(xaA * aB, aR)
+
+
+def _out_alpha_composite(aA, aB) -> np.ndarray:
+    return aA * (1 - aB)
+
+
+def _out_color_composite(xA, aA, xB, aB, xaA, xaB, aR) -> np.ndarray:
+    return _safe_divide(xaA * (1 - aB), aR)
+
+
+def _atop_alpha_composite(aA, aB) -> np.ndarray:
+    return aB
+
+
+def _atop_color_composite(xA, aA, xB, aB, xaA, xaB, aR) -> np.ndarray:
+    return _safe_divide(xaA * aB + xaB * (1 - aA), aR)
+
+
+def _xor_alpha_composite(aA, aB) -> np.ndarray:
+    return aA + aB - 2 * aA * aB
+
+
+def _xor_color_composite(xA, aA, xB, aB, xaA, xaB, aR) -> np.ndarray:
+    return _safe_divide(xaA * (1 - aB) + xaB * (1 - aA), aR)
+
+
+def _saturate_alpha_composite(aA, aB) -> np.ndarray:
+    return np.minimum(1, aA + aB)
+
+
+def _saturate_color_composite(xA, aA, xB, aB, xaA, xaB, aR) -> np.ndarray:
+    return _safe_divide(np.minimum(aA, 1 - aB) * xA + xaB, aR)
+
+
+# The premultiplied composite functions write the result into the dest color
+# xaB and alpha aB in place. They use the RGBA shaped scratch buffer s for
+# intermediate values so that they do not allocate.
+
+
+def _over_premultiplied_composite(xaA, aA, xaB, aB, s):
+    t = s[:,:,3:]
+    np.subtract(1, aA, out=t)
+    xaB *= t
+    xaB += xaA
+    aB *= t
+    aB += aA
+
+
+def _dest_over_premultiplied_composite(xaA, aA, xaB, aB, s):
+    tc, t = s[:,:,:3], s[:,:,3:]
+    np.subtract(1, aB, out=t)
+    np.multiply(xaA, t, out=tc)
+    xaB += tc
+    t *= aA
+    aB += t
+
+
+def _add_premultiplied_composite(xaA, aA, xaB, aB, s):
+    xaB += xaA
+    aB += aA
+    np.minimum(aB, 1, out=aB)
+
+
+def _multiply_premultiplied_composite(xaA, aA, xaB, aB, s):
+    tc, t = s[:,:,:3], s[:,:,3:]
+    np.subtract(xaA, aA, out=tc)
+    tc += 1
+    xaB *= tc
+    np.subtract(1, aB, out=t)
+    np.multiply(xaA, t, out=tc)
+    xaB += tc
+    np.subtract(1, aA, out=t)
+    aB *= t
+    aB += aA
+
+
+def _screen_premultiplied_composite(xaA, aA, xaB, aB, s):
+    tc, t = s[:,:,:3], s[:,:,3:]
+    np.subtract(1, xaA, out=tc)
+    xaB *= tc
+    xaB += xaA
+    np.subtract(1, aA, out=t)
+    aB *= t
+    aB += aA
+
+
+def _in_premultiplied_composite(xaA, aA, xaB, aB, s):
+    np.multiply(xaA, aB, out=xaB)
+    aB *= aA
+
+
+def _out_premultiplied_composite(xaA, aA, xaB, aB, s):
+    t = s[:,:,3:]
+    np.subtract(1, aB, out=t)
+    np.multiply(xaA, t, out=xaB)
+    np.multiply(aA, t, out=aB)
+
+
+def _atop_premultiplied_composite(xaA, aA, xaB, aB, s):
+    tc, t = s[:,:,:3], s[:,:,3:]
+    np.subtract(1, aA, out=t)
+    xaB *= t
+    np.multiply(xaA, aB, out=tc)
+    xaB += tc
+
+
+def _xor_premultiplied_composite(xaA, aA, xaB, aB, s):
+    tc, t = s[:,:,:3], s[:,:,3:]
+    np.subtract(1, aA, out=t)
+    xaB *= t
+    np.subtract(1, aB, out=t)
+    np.multiply(xaA, t, out=tc)
+    xaB += tc
+    t -= aB
+    t *= aA
+    aB += t
+
+
+def _saturate_premultiplied_composite(xaA, aA, xaB, aB, s):
+    tc, t, u = s[:,:,:3], s[:,:,3:], s[:,:,:1]
+    # scale source color by min(1, (1 - aB) / aA) where aA > 0
+    np.subtract(1, aB, out=t)
+    np.minimum(t, aA, out=t)
+    np.maximum(aA, np.finfo(float).tiny, out=u)
+    np.divide(t, u, out=t)
+    np.multiply(xaA, t, out=tc)
+    xaB += tc
+    aB += aA
+    np.minimum(aB, 1, out=aB)
+
+
+CompositeOp = namedtuple('CompositeOp', 'alpha color premultiplied')
+CompositeOp.__new__.__defaults__ = (None,)
 CompositeOp.__doc__ = """\
 Image alpha compositing operators.
 
@@ -122,6 +276,10 @@ To learn more about image alpha compositing, see `Alpha Compositing`_.
 Parameters:
     alpha (Callable): The function producing the alpha of the resulting image.
     color (Callable): The function producing the color of the resulting image.
+    premultiplied (Callable): Optional function compositing premultiplied \
+        source color and alpha onto premultiplied dest color and alpha in \
+        place. It is passed an RGBA shaped scratch buffer as its last \
+        argument. Operators without one fall back to alpha and color.
 
 .. _Alpha Compositing: https://en.wikipedia.org/wiki/Alpha_compositing
 """
@@ -135,13 +293,44 @@ class CompositeOpName(Enum):
     -  (OVER): two semi-transparent slides; source over dest.
     -  (DEST_OVER): two semi-transparent slides; dest over source.
     -  (ADD): Add source and dest.
+    -  (MULTIPLY): Multiply source and dest colors. The result is darker.
+    -  (SCREEN): Invert, multiply, and invert colors. The result is lighter.
+    -  (IN): Source where there is dest; dest is cleared.
+    -  (OUT): Source where there is no dest; dest is cleared.
+    -  (ATOP): Source where there is dest; dest elsewhere.
+    -  (XOR): Source where there is no dest; dest where there is no source.
+    -  (SATURATE): Add source to dest only as far as dest alpha allows.
+
+    IN and OUT are unbounded: dest outside of the source is cleared.
 
     .. _Cairo: https://www.cairographics.org/operators
     """
-    OVER = CompositeOp(_over_alpha_composite, _over_color_composite)
+    OVER = CompositeOp(_over_alpha_composite, _over_color_composite,
+                       _over_premultiplied_composite)
     DEST_OVER = CompositeOp(_dest_over_alpha_composite,
-                            _dest_over_color_composite)
-    ADD = CompositeOp(_add_alpha_composite, _add_color_composite)
+                            _dest_over_color_composite,
+                            _dest_over_premultiplied_composite)
+    ADD = CompositeOp(_add_alpha_composite, _add_color_composite,
+                      _add_premultiplied_composite)
+    MULTIPLY = CompositeOp(_multiply_alpha_composite,
+                           _multiply_color_composite,
+                           _multiply_premultiplied_composite)
+    SCREEN = CompositeOp(_screen_alpha_composite, _screen_color_composite,
+                         _screen_premultiplied_composite)
+    IN = CompositeOp(_in_alpha_composite, _in_color_composite,
+                     _in_premultiplied_composite)
+    OUT = CompositeOp(_out_alpha_composite, _out_color_composite,
+                      _out_premultiplied_composite)
+    ATOP = CompositeOp(_atop_alpha_composite, _atop_color_composite,
+                       _atop_premultiplied_composite)
+    XOR = CompositeOp(_xor_alpha_composite, _xor_color_composite,
+                      _xor_premultiplied_composite)
+    SATURATE = CompositeOp(_saturate_alpha_composite,
+                           _saturate_color_composite,
+                           _saturate_premultiplied_composite)
+
+
+_UNBOUNDED_OPS = (CompositeOpName.IN.value, CompositeOpName.OUT.value)
 
 
 EPSILON = 1.0e-6
@@ -274,14 +463,79 @@ def blur(image: np.ndarray, sigma: float, radius: float = 0) -> np.ndarray:
     return rescale(image, k=1, filter=filter)
 
 
+def _composite_premultiplied(operator: CompositeOp, xaA: np.ndarray,
+                             aA: np.ndarray, xaB: np.ndarray,
+                             aB: np.ndarray, scratch: np.ndarray = None):
+    """Composite premultiplied source onto premultiplied dest in place."""
+    if operator.premultiplied is not None:
+        if scratch is None:
+            scratch = np.empty(aB.shape[:2] + (4,))
+        operator.premultiplied(xaA, aA, xaB, aB, scratch)
+        return
+    xA = _safe_divide(xaA, aA)
+    xB = _safe_divide(xaB, aB)
+    aR = operator.alpha(aA, aB)
+    xR = operator.color(xA, aA, xB, aB, xaA, xaB, aR)
+    np.multiply(xR, aR, out=xaB)
+    aB[...] = aR
+
+
+def premultiply(image: np.ndarray) -> np.ndarray:
+    """Return the RGBA image with its color premultiplied by its alpha.
+
+    Args:
+        image (np.ndarray): RGBA image.
+
+    Returns:
+        np.ndarray: Premultiplied RGBA image.
+    """
+    image = np.array(image, dtype=float)
+    image[:,:,:3] *= image[:,:,3:]
+    return image
+
+
+def unpremultiply(image: np.ndarray) -> np.ndarray:
+    """Return the RGBA image with its premultiplied color divided by its alpha.
+
+    The color of fully transparent pixels is zero.
+
+    Args:
+        image (np.ndarray): Premultiplied RGBA image.
+
+    Returns:
+        np.ndarray: RGBA image.
+    """
+    image = np.array(image, dtype=float)
+    x, a = image[:,:,:3], image[:,:,3:]
+    np.divide(x, a, out=x, where=(a != 0))
+    return image
+
+
 def composite(source: np.ndarray, dest: np.ndarray,
               operator: Union[CompositeOpName, CompositeOp] =
-              CompositeOpName.OVER) -> np.ndarray:
+              CompositeOpName.OVER, premultiplied: bool = False,
+              x: float = None, y: float = None, relative: bool = False,
+              loc: Loc = Loc.UPPER_LEFT, out: np.ndarray = None,
+              scratch: np.ndarray = None) -> np.ndarray:
     """Return the image formed by compositing one image with another.
 
     For more information about alpha compositing, see `Alpha Compositing`_. The
     implementation is largely based on the `Cairo`_ implementation.
 
+    If premultiplied is True, both images are expected to be premultiplied
+    (see premultiply) and the result is premultiplied as well. This avoids
+    dividing by alpha after every composite when chaining composites. The
+    result can be passed to unpremultiply or written with write_png.
+
+    If a point (x,y) is given (both coordinates are required), the source is
+    placed at that point as it would be by substitute and may be smaller than
+    dest. Only the region where the source overlaps dest is composited and it
+    is written into dest in place.
+
+    If out is given, dest is copied into out (unless out is dest) and the
+    result is written into it. Together with a reusable scratch buffer and
+    premultiplied images, this composites without allocating any frames.
+
     .. _Alpha Compositing: https://en.wikipedia.org/wiki/Alpha_compositing
     .. _Cairo: https://www.cairographics.org/operators
 
@@ -290,18 +544,70 @@ def composite(source: np.ndarray, dest: np.ndarray,
         dest (np.ndarray): Image on bottom.
         operator (Union[CompositeOpName, CompositeOp]): \
             The compositing operator to use.
+        premultiplied (bool): True if the images are premultiplied. \
+            Defaults to False.
+        x (float): x coordinate of the point (relative to left of dest).
+        y (float): y coordinate of the point (relative to top of dest).
+        relative (bool): If True, x and y are given relative to the \
+            dimensions of dest. Defaults to False.
+        loc (Loc): Location of (x,y) relative to the source.
+        out (np.ndarray): Float array of the shape of dest to write the \
+            result into. Defaults to a new array (or dest if (x,y) is given).
+        scratch (np.ndarray): Float RGBA buffer at least the size of dest \
+            used by the operator. Defaults to a new buffer.
 
     Returns:
         np.ndarray: The two images overlaid.
     """
+    if (x is None) != (y is None):
+        raise ValueError("Provide both x and y or neither.")
+    if not isinstance(operator, CompositeOp):
+        operator = operator.value
+
+    if out is not None:
+        if out.shape != dest.shape:
+            raise ValueError("out must have the same shape as dest.")
+        if out is not dest:
+            np.copyto(out, dest)
+
+    if x is None and y is None:
+        if out is None and not premultiplied:
+            return _composite_straight(source, dest, operator)
+        if out is None:
+            out = np.array(dest, dtype=float)
+        x, y = 0, 0
+    elif out is None:
+        out = dest
+
+    overlap = _overlap(out, source, x, y, relative, loc)
+    if operator in _UNBOUNDED_OPS:
+        _clear_outside(out, overlap)
+    if overlap is None:
+        return out
+    (rows, cols), (source_rows, source_cols) = overlap
+    source = source[source_rows, source_cols]
+    region = out[rows, cols]
+    if scratch is not None:
+        scratch = scratch[:region.shape[0], :region.shape[1]]
+    xaA, aA = source[:,:,:3], source[:,:,3:]
+    xaB, aB = region[:,:,:3], region[:,:,3:]
+    if not premultiplied:
+        xaA = xaA * aA
+        xaB *= aB
+    _composite_premultiplied(operator, xaA, aA, xaB, aB, scratch)
+    if not premultiplied:
+        np.divide(xaB, aB, out=xaB, where=(aB != 0))
+    return out
+
+
+def _composite_straight(source: np.ndarray, dest: np.ndarray,
+                        operator: CompositeOp) -> np.ndarray:
+    """Composite two full frames with straight (not premultiplied) alpha."""
     xA, aA = np.split(source, [3], axis=2)
     xB, aB = np.split(dest, [3], axis=2)
     xaA = xA * aA
     xaB = xB * aB
 
-    if not isinstance(operator, CompositeOp):
-        operator = operator.value
-
     alpha_composite = operator.alpha
     color_composite = operator.color
 
@@ -330,6 +636,109 @@ def _standardize_selection(image: np.ndarray, x: float, y: float, w: float,
     return int(x), int(y), int(w), int(h)
 
 
+def _clear_outside(image: np.ndarray, overlap: Tuple[tuple, tuple]):
+    """Clear the image outside of the overlap returned by _overlap."""
+    if overlap is None:
+        image[...] = 0
+        return
+    (rows, cols), _ = overlap
+    image[:rows.start] = 0
+    image[rows.stop:] = 0
+    image[rows, :cols.start] = 0
+    image[rows, cols.stop:] = 0
+
+
+def _overlap(image: np.ndarray, layer: np.ndarray, x: float, y: float,
+             relative: bool, loc: Loc) -> Tuple[tuple, tuple]:
+    """Return the overlapping slices of image and layer placed at (x,y).
+
+    The layer is placed as it would be by substitute but is clipped to the
+    bounds of image. Returns None if the two do not overlap.
+    """
+    n,m,*_ = image.shape
+    h,w,*_ = layer.shape
+    if relative:
+        x, y, *_ = _standardize_selection(image, x, y, w / m, h / n,
+                                          relative, loc)
+    else:
+        x, y, *_ = _standardize_selection(image, x, y, w, h, relative, loc)
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + w, m), min(y + h, n)
+    if x0 >= x1 or y0 >= y1:
+        return None
+    return ((slice(y0, y1), slice(x0, x1)),
+            (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x)))
+
+
+def composite_stack(layers: List[np.ndarray],
+                    operators: Union[CompositeOpName, CompositeOp,
+                                     List[Union[CompositeOpName,
+                                                CompositeOp]]] =
+                    CompositeOpName.OVER,
+                    offsets: List[Tuple[float, float]] = None,
+                    relative: bool = False, loc: Loc = Loc.UPPER_LEFT,
+                    premultiplied: bool = False) -> np.ndarray:
+    """Return the image formed by compositing a stack of layers.
+
+    The first layer is the bottom of the stack and determines the size of the
+    result. Every other layer is composited onto the layers below it in turn.
+    The stack is flattened in a single premultiplied buffer which is updated
+    in place, and only the region each layer overlaps is touched.
+
+    Args:
+        layers (List[np.ndarray]): RGBA layers from bottom to top.
+        operators (Union[CompositeOpName, CompositeOp, List]): The \
+            compositing operator to use for every layer or a list with one \
+            operator per layer above the bottom layer.
+        offsets (List[Tuple[float, float]]): (x,y) point of each layer above \
+            the bottom layer (see substitute). Defaults to the upper left.
+        relative (bool): If True, offsets are given relative to the \
+            dimensions of the bottom layer. Defaults to False.
+        loc (Loc): Location of (x,y) relative to each layer.
+        premultiplied (bool): True if the layers are premultiplied. The \
+            result is then premultiplied as well. Defaults to False.
+
+    Returns:
+        np.ndarray: The flattened stack of layers.
+    """
+    if len(layers) == 0:
+        raise ValueError("Provide at least one layer.")
+    if any(layer.ndim != 3 or layer.shape[2] != 4 for layer in layers):
+        raise ValueError("Layers must be RGBA images.")
+    if not isinstance(operators, list):
+        operators = [operators] * (len(layers) - 1)
+    if offsets is None:
+        offsets = [(0, 0)] * (len(layers) - 1)
+    if len(operators) != len(layers) - 1 or len(offsets) != len(layers) - 1:
+        raise ValueError("Provide one operator and offset per layer above "
+                         "the bottom layer.")
+
+    result = np.array(layers[0], dtype=float)
+    xaB, aB = result[:,:,:3], result[:,:,3:]
+    if not premultiplied:
+        xaB *= aB
+    scratch = np.empty_like(result)
+    premultiplied_source = None if premultiplied else np.empty_like(xaB)
+    for layer, operator, (x, y) in zip(layers[1:], operators, offsets):
+        if not isinstance(operator, CompositeOp):
+            operator = operator.value
+        overlap = _overlap(result, layer, x, y, relative, loc)
+        if operator in _UNBOUNDED_OPS:
+            _clear_outside(result, overlap)
+        if overlap is None:
+            continue
+        (rows, cols), (layer_rows, layer_cols) = overlap
+        source = layer[layer_rows, layer_cols]
+        xaA, aA = source[:,:,:3], source[:,:,3:]
+        if not premultiplied:
+            xaA = np.multiply(xaA, aA, out=premultiplied_source[rows, cols])
+        _composite_premultiplied(operator, xaA, aA, xaB[rows, cols],
+                                 aB[rows, cols], scratch[rows, cols])
+    if not premultiplied:
+        np.divide(xaB, aB, out=xaB, where=(aB != 0))
+    return result
+
+
 def substitute(image: np.ndarray, substitution: np.ndarray, x: float, y: float,
                relative: bool = False,
                loc: Loc = Loc.UPPER_LEFT) -> np.ndarray: